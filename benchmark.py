@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+"""
+end-to-end benchmark against the mock server
+
+starts mock_server.py in the background, then runs cache, find participants,
+collect participant info, do task and collect latest result one after the
+other in a scratch directory, with one logged-in Chrome shared between them.
+For each stage it reports participants per minute, p50/p95/p99 per-participant
+latency (the time between two participants being journaled), and how many
+WebDriver commands and HTTP requests it made. The page_load stage times plain
+driver.get() calls, to compare Chrome settings such as ISLANDS_BLOCK. The report
+is saved as JSON under benchmarks/ with the commit it was run on, and --compare
+puts two reports side by side.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+import numpy as np
+import httpx
+
+import subprocess
+import datetime
+import tempfile
+import argparse
+import socket
+import json
+import time
+import os
+
+from journal import Journal, FINISHED
+
+parser = argparse.ArgumentParser(description="Time every stage against the mock server")
+parser.add_argument("--sample-size", type=int, default=10)
+parser.add_argument("--minimum-age", type=int, default=18)
+parser.add_argument("--maximum-age", type=int, default=75)
+parser.add_argument("--task", default="ruler", help="task do_task.py starts")
+parser.add_argument("--tabs", type=int, default=1, help="tabs do_task.py works in at once")
+parser.add_argument(
+    "--http", action="store_true", help="run the stages in their --http mode where they have one"
+)
+parser.add_argument(
+    "--stages",
+    default=",".join(
+        ["cache", "find_participants", "collect_participant_info", "do_task", "collect_latest_result"]
+    ),
+    help="comma separated stages to run, in order (later stages need the files of earlier ones); "
+    "page_load can be added to time page loads on their own",
+)
+parser.add_argument(
+    "--page-loads", type=int, default=30, help="islander pages the page_load stage opens"
+)
+parser.add_argument("--seed", type=int, default=0, help="mock world to generate")
+parser.add_argument("--cities", type=int, default=10)
+parser.add_argument("--latency", type=float, default=0.05)
+parser.add_argument("--jitter", type=float, default=0.02)
+parser.add_argument("--task-seconds", type=float, default=1.0)
+parser.add_argument("--asset-kb", type=int, default=200)
+parser.add_argument("--workdir", help="directory the stages write into (default: a new temporary one)")
+parser.add_argument("--output", help="report file (default: benchmarks/<time>-<commit>.json)")
+parser.add_argument(
+    "--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved reports and exit"
+)
+
+################################################################################################################
+## COUNTERS
+################################################################################################################
+
+
+class Counters:
+    """WebDriver commands, HTTP requests and journal writes since the last reset"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.webdriver_calls = 0
+        self.http_requests = 0
+        self.journaled = []  # time.time() of every participant journaled
+
+    def install(self):
+        """Count every WebDriver command, HTTP request and journal entry made from now on"""
+        counters = self
+
+        webdriver_execute = WebDriver.execute
+
+        def execute(driver, *args, **kwargs):
+            counters.webdriver_calls += 1
+            return webdriver_execute(driver, *args, **kwargs)
+
+        client_send = httpx.Client.send
+
+        def send(client, *args, **kwargs):
+            counters.http_requests += 1
+            return client_send(client, *args, **kwargs)
+
+        async_client_send = httpx.AsyncClient.send
+
+        async def async_send(client, *args, **kwargs):
+            counters.http_requests += 1
+            return await async_client_send(client, *args, **kwargs)
+
+        journal_append = Journal.append
+
+        def append(journal, entry):
+            if entry != FINISHED:
+                counters.journaled.append(time.time())
+            return journal_append(journal, entry)
+
+        WebDriver.execute = execute
+        httpx.Client.send = send
+        httpx.AsyncClient.send = async_send
+        Journal.append = append
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def stage_report(seconds, items, latencies, counters):
+    """Throughput, latency percentiles and round trips of one stage"""
+    report = {
+        "seconds": round(seconds, 3),
+        "items": items,
+        "per_minute": round(items / seconds * 60, 2) if seconds > 0 else None,
+        "webdriver_calls": counters.webdriver_calls,
+        "http_requests": counters.http_requests,
+        "webdriver_calls_per_item": round(counters.webdriver_calls / items, 2) if items else None,
+        "http_requests_per_item": round(counters.http_requests / items, 2) if items else None,
+        "latency": None,
+    }
+    if len(latencies):
+        latencies = np.array(latencies)
+        report["latency"] = {
+            "mean": round(float(latencies.mean()), 3),
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+        }
+    return report
+
+
+def load_pages(driver, count):
+    """Open index.php, a village and then islander pages one after another, returning each load time"""
+    from session import INDEX_URL, BASE_URL
+
+    urls = [INDEX_URL, f"{BASE_URL}/village.php?id=0"]
+    urls += [f"{BASE_URL}/islander.php?id={islander}" for islander in range(1, count + 1)]
+    times = []
+    for url in urls:
+        start = time.time()
+        driver.get(url)
+        times.append(time.time() - start)
+    return times
+
+
+################################################################################################################
+## BENCHMARK
+################################################################################################################
+
+
+def run_benchmark(args, counters):
+    """Run the chosen stages one after the other, returning {stage: report}"""
+    # The stages read ISLANDS_BASE_URL when session.py is imported, so they are imported only
+    # once main() has pointed it at the mock server
+    from session import start_logged_in_driver
+    from cache_store import HouseCache, CACHE_FILE
+    from cache import build_cache
+    from find_participants import find_participants
+    from collect_participant_info import collect_participant_info
+    from do_task import run_task
+    from collect_latest_result import collect_latest_results
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+
+    # Chrome is started and logged in outside the timings, the way study.py shares it
+    driver = None
+    if not (args.http and set(stages) <= {"cache", "collect_latest_result"}):
+        driver = start_logged_in_driver()
+
+    reports = {}
+    try:
+        for stage in stages:
+            print(f"\n{'=' * 30} {stage} {'=' * 30}")
+            counters.reset()
+            start = time.time()
+
+            if stage == "cache":
+                driver = build_cache(use_http=args.http, driver=driver)
+                items = len(HouseCache.open(CACHE_FILE))
+            elif stage == "find_participants":
+                items, driver = find_participants(
+                    args.sample_size,
+                    args.minimum_age,
+                    args.maximum_age,
+                    use_http=args.http,
+                    use_census=False,
+                    driver=driver,
+                )
+            elif stage == "collect_participant_info":
+                items = len(collect_participant_info(use_http=args.http, driver=driver))
+            elif stage == "do_task":
+                completed, failed, driver = run_task(args.task, driver=driver, tabs=args.tabs)
+                items = completed + failed
+            elif stage == "collect_latest_result":
+                data, driver = collect_latest_results(use_http=args.http, driver=driver)
+                items = len(data)
+            elif stage == "page_load":
+                page_times = load_pages(driver, args.page_loads)
+                items = len(page_times)
+            else:
+                print(f"Unknown stage {stage}, skipping")
+                continue
+
+            seconds = time.time() - start
+            # Per participant: the time since the previous participant was journaled
+            latencies = np.diff([start] + counters.journaled)
+            if stage == "page_load":
+                latencies = page_times
+            reports[stage] = stage_report(seconds, items, latencies, counters)
+            print(f"{stage}: {json.dumps(reports[stage])}")
+    finally:
+        if driver is not None:
+            driver.quit()
+
+    return reports
+
+
+def print_comparison(before_path, after_path):
+    """Print the headline numbers of two reports side by side"""
+    with open(before_path, "r") as before_file:
+        before = json.load(before_file)
+    with open(after_path, "r") as after_file:
+        after = json.load(after_file)
+
+    print(f"{'':28}{before['commit']:>14}{after['commit']:>14}{'change':>10}")
+    for stage in before["stages"]:
+        if stage not in after["stages"]:
+            continue
+        print(stage)
+        old, new = before["stages"][stage], after["stages"][stage]
+        rows = [
+            ("per minute", old["per_minute"], new["per_minute"]),
+            ("webdriver calls / item", old["webdriver_calls_per_item"], new["webdriver_calls_per_item"]),
+            ("http requests / item", old["http_requests_per_item"], new["http_requests_per_item"]),
+        ]
+        if old["latency"] and new["latency"]:
+            for percentile in ("p50", "p95", "p99"):
+                rows.append(
+                    (f"{percentile} latency s", old["latency"][percentile], new["latency"][percentile])
+                )
+        for name, old_value, new_value in rows:
+            change = ""
+            if old_value and new_value is not None:
+                change = f"{(new_value - old_value) / old_value:+.0%}"
+            print(f"  {name:26}{str(old_value):>14}{str(new_value):>14}{change:>10}")
+
+
+################################################################################################################
+## RUN
+################################################################################################################
+
+
+def main():
+    args = parser.parse_args()
+
+    if args.compare:
+        print_comparison(*args.compare)
+        return
+
+    output = args.output
+    commit = current_commit()
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join("benchmarks", f"{stamp}-{commit}.json")
+    output = os.path.abspath(output)
+
+    port = free_port()
+    os.environ["ISLANDS_BASE_URL"] = f"http://127.0.0.1:{port}"
+    from mock_server import MockIslands, generate_world, start_server
+    from session import BLOCK, PAGE_LOAD_STRATEGY, CAPTURE
+
+    islands = MockIslands(
+        generate_world(args.seed, args.cities),
+        latency=args.latency,
+        jitter=args.jitter,
+        task_seconds=args.task_seconds,
+        seed=args.seed,
+        asset_kb=args.asset_kb,
+    )
+    server = start_server(islands, port=port)
+
+    # The stages write their files into the current directory, keep them away from real data
+    workdir = args.workdir or tempfile.mkdtemp(prefix="islands-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    with open("session_cookie", "w") as cookie_file:
+        cookie_file.write("benchmark")
+    print(f"Mock server on port {port}, working in {workdir}")
+
+    counters = Counters()
+    counters.install()
+    try:
+        reports = run_benchmark(args, counters)
+    finally:
+        server.shutdown()
+
+    report = {
+        "commit": commit,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("compare", "output", "workdir")
+        },
+        "chrome": {"block": BLOCK, "page_load_strategy": PAGE_LOAD_STRATEGY, "capture": CAPTURE},
+        "stages": reports,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"\nReport saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,195 +3,241 @@
 """
 caching function that stores all of the indices of cities
 
-speeds up the lookup time drastically
+speeds up the lookup time drastically. The house ids are written to cache.bin
+(see cache_store.py) together with a fingerprint of the island map and of every city.
 """
 
 ################################################################################################################
 ## IMPORTS
 ################################################################################################################
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.action_chains import ActionChains
-
-import numpy as np
-import pandas as pd
+from selenium.webdriver.support.ui import WebDriverWait
 
 import time
 import datetime
 
-import pickle
+import argparse
+import asyncio
+import os
+
+from session import INDEX_URL, read_session_id, start_logged_in_driver
+from http_backend import HttpBackend, AsyncHttpBackend
+from census import CENSUS_DIR, run_census
+from navigation import relative_href, city_on_map, click_city
+from extract import extract_village
+from waits import page_ready
+from cache_store import (
+    CACHE_FILE,
+    CacheFormatError,
+    HouseCache,
+    changed_cities,
+    write_cache,
+)
+
+parser = argparse.ArgumentParser(description="Cache the house indices of every city")
+parser.add_argument(
+    "--http",
+    action="store_true",
+    help="read the village pages over HTTP instead of driving Chrome",
+)
+parser.add_argument(
+    "--async",
+    dest="use_async",
+    action="store_true",
+    help="fetch all village pages concurrently over HTTP (implies --http)",
+)
+parser.add_argument(
+    "--census",
+    action="store_true",
+    help="also crawl every house and islander into the census/ dataset (resumes if interrupted)",
+)
+parser.add_argument(
+    "--refresh",
+    action="store_true",
+    help="re-read the village pages concurrently and recrawl the census only for cities that changed (implies --async)",
+)
+parser.add_argument(
+    "--concurrency",
+    type=int,
+    default=8,
+    help="maximum requests in flight with --async or --census (default: 8)",
+)
+################################################################################################################
+## HTTP CRAWL
+################################################################################################################
+
+
+def cache_with_http():
+    """Build the cache from the village pages without starting a browser
+
+    returns the house ids of every city in page order and the village hrefs of the map
+    """
+    cache = []
+    with HttpBackend(read_session_id()) as backend:
+        backend.login()
+        village_hrefs = backend.village_hrefs()
+        for cityindex in range(len(village_hrefs)):
+            village = backend.village(cityindex)
+            print("Cached " + village["title"].capitalize())
+            cache.append(village["house_ids"])
+    return cache, village_hrefs
 
-start_time = time.time()
 
 ################################################################################################################
-## LOGIN
+## ASYNC CRAWL
 ################################################################################################################
 
-# Setup Chrome options
-chrome_options = Options()
-chrome_options.add_experimental_option("detach", True)
-chrome_options.add_argument("--start-maximized")  # Still useful for viewport size
-chrome_options.add_argument("--headless=new")  # This runs Chrome in background
-chrome_options.add_argument("--disable-gpu")  # Recommended for headless
-chrome_options.add_argument("--window-size=1920,1080")  # Set viewport explicitly
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-
-# Initialize the driver
-driver = webdriver.Chrome(options=chrome_options)
-
-# Read session cookie from file
-try:
-    with open("session_cookie", "r") as cookie_file:
-        session_id = cookie_file.read().strip()
-        print(f"Read session ID from file: {session_id}")
-except FileNotFoundError:
-    print(
-        "Error: session_cookie file not found. Please create this file with your session ID."
-    )
-    driver.quit()
-    exit(1)
-except Exception as e:
-    print(f"Error reading session_cookie file: {e}")
-    driver.quit()
-    exit(1)
-
-# Check if session ID is empty
-if not session_id:
-    print(
-        "Error: session_cookie file is empty. Please add your session ID to this file."
-    )
-    driver.quit()
-    exit(1)
-
-# Navigate to the login page
-driver.get("https://islands.smp.uq.edu.au/login.php")
-
-# Wait for page to load
-driver.implicitly_wait(1)
-
-# Get the current PHPSESSID cookie (if it exists)
-phpsessid_cookie = driver.get_cookie("PHPSESSID")
-print(phpsessid_cookie)
-
-# If the cookie doesn't exist yet, create a new one
-if not phpsessid_cookie:
-    print("PHPSESSID cookie not found, creating new one")
-    # Use session ID from file
-    driver.add_cookie(
-        {
-            "name": "PHPSESSID",
-            "value": session_id,
-            "path": "/",
-            "domain": "islands.smp.uq.edu.au",
-        }
-    )
-else:
-    # Modify the existing cookie
-    print(f"Found existing PHPSESSID: {phpsessid_cookie['value']}")
-    # Replace with session ID from file
-    driver.delete_cookie("PHPSESSID")
-    driver.add_cookie(
-        {
-            "name": "PHPSESSID",
-            "value": session_id,
-            "path": "/",
-            "domain": "islands.smp.uq.edu.au",
-        }
-    )
 
-# Verify the cookie was set
-updated_cookie = driver.get_cookie("PHPSESSID")
-print(f"Updated PHPSESSID: {updated_cookie['value']}")
+def cache_with_async(concurrency):
+    """Build the cache by fetching every village page concurrently"""
 
-# Refresh the page to apply the cookie
-driver.get("https://islands.smp.uq.edu.au/index.php")
-driver.implicitly_wait(3)
+    async def crawl():
+        async with AsyncHttpBackend(
+            read_session_id(), concurrency=concurrency
+        ) as backend:
+            await backend.login()
+            return await backend.villages(), await backend.village_hrefs()
+
+    cache = []
+    villages, village_hrefs = asyncio.run(crawl())
+    for village in villages:
+        print("Cached " + village["title"].capitalize())
+        cache.append(village["house_ids"])
+    return cache, village_hrefs
 
-# Check if login was successful
-if "login.php" in driver.current_url:
-    print("Login failed - still on login page. Check if your session ID is valid.")
-    driver.quit()
-    exit(1)
-else:
-    print("Successfully logged in!")
 
 ################################################################################################################
-## ENUMERATE CONSTANTS AND DATA STRUCTURES
+## SELENIUM CRAWL
 ################################################################################################################
 
-cities = driver.find_elements(By.XPATH, '//a[starts-with(@href, "village")]')
-NUM_CITIES = len(cities)
 
-buttons = []
-for j in cities:
-    buttons.append(j.find_element(By.XPATH, './/div[starts-with(@class, "town town")]'))
+def cache_with_selenium(driver=None):
+    """Build the cache by clicking through every city in Chrome
+
+    pass a logged-in driver to reuse it, otherwise a new one is started
+    """
+
+    ## LOGIN
+
+    if driver is None:
+        driver = start_logged_in_driver()
+    else:
+        driver.get(INDEX_URL)
+
+    ## ENUMERATE CONSTANTS AND DATA STRUCTURES
+
+    wait = WebDriverWait(driver, 10)
+    NUM_CITIES, _, _ = wait.until(city_on_map(0))
 
-assert len(buttons) == NUM_CITIES
+    # cache datastructure
+    cache = []
+    village_hrefs = []
 
-# cache datastructure
-cache = []
+    ## ITERATE
+
+    for cityindex in range(NUM_CITIES):
+        # reprocess island page: the button is looked up fresh, so it is never stale
+        if not click_city(driver, wait, cityindex):
+            continue
+
+        ### PERFORM SOME TASK HERE ###
+        # Title and every house id in one round trip
+        village = extract_village(driver)
+        print("Cached " + village["title"].capitalize())
+
+        village_hrefs.append(relative_href(driver.current_url))
+
+        cache.append(village["house_ids"])
+
+        ### END TASK//
+
+        driver.back()
+        page_ready(driver, "index")
+
+    return cache, village_hrefs, driver
 
 
 ################################################################################################################
-## ITERATE
+## STAGE
 ################################################################################################################
 
-for cityindex in range(NUM_CITIES):
-    # reprocess island page
-    cities = driver.find_elements(By.XPATH, '//a[starts-with(@href, "village")]')
-    buttons = []
-    for j in cities:
-        buttons.append(
-            j.find_element(By.XPATH, './/div[starts-with(@class, "town town")]')
-        )
-    buttons[cityindex].click()
-    driver.implicitly_wait(3)
 
-    ### PERFORM SOME TASK HERE ###
-    isl = driver.find_element(By.ID, "title")
-    print("Cached " + isl.text.capitalize())
+def build_cache(
+    use_http=False,
+    use_async=False,
+    refresh=False,
+    census=False,
+    concurrency=8,
+    driver=None,
+):
+    """Crawl the house ids of every city into cache.bin (and the census if asked), returning the driver
+
+    only the Selenium crawl uses a driver; pass a logged-in one to reuse it
+    """
+    # Keep the previous cache around to see which cities changed
+    try:
+        previous = HouseCache.open(CACHE_FILE)
+    except CacheFormatError as e:
+        print(f"No previous cache to compare against: {e}")
+        previous = None
 
-    houses = driver.find_elements(By.CLASS_NAME, "house")
+    if use_async or refresh:
+        cache, village_hrefs = cache_with_async(concurrency)
+    elif use_http:
+        cache, village_hrefs = cache_with_http()
+    else:
+        cache, village_hrefs, driver = cache_with_selenium(driver)
 
-    ids = driver.find_elements(By.CLASS_NAME, "houseid")
+    print("cities cached: " + str(len(cache)))
 
-    hashid = {}
-    trueindics = np.array(range(0, len(ids)))
-    houseids = np.array([id.text for id in ids])
-    setids = set(houseids)
+    # Without a previous cache nothing is known to have changed, so census shards are kept
+    changed = []
+    if previous is not None:
+        changed = changed_cities(previous, cache, village_hrefs)
+        print(f"{len(changed)} of {len(cache)} cities are new or changed since the last cache")
 
-    for house, indic in zip(houseids, trueindics):
-        hashid[house] = int(indic)
+    # Drop the memory map before the file underneath it is replaced
+    previous = None
 
-    ### find the number of houses
-    NUM_HOUSES = houseids[-1]
+    # save the cache into a file
+    write_cache(cache, village_hrefs, CACHE_FILE)
+    print(f"Cache written to {CACHE_FILE}")
 
-    cache.append(hashid)
+    # A refresh updates an existing census too, but only for the cities that changed
+    if census or (refresh and os.path.isdir(CENSUS_DIR)):
+        run_census(read_session_id(), concurrency, stale=changed)
 
-    ### END TASK//
+    return driver
 
-    driver.back()
-    driver.implicitly_wait(3)
 
+################################################################################################################
+## RUN
+################################################################################################################
 
-print("cities cached: " + str(len(cache)))
 
-# save the cache into a file
-file = open(r"cache", "wb")
-pickle.dump(cache, file)
-file.close()
+def main():
+    args = parser.parse_args()
 
+    start_time = time.time()
 
-end_time = time.time()
+    driver = build_cache(
+        use_http=args.http,
+        use_async=args.use_async,
+        refresh=args.refresh,
+        census=args.census,
+        concurrency=args.concurrency,
+    )
+
+    end_time = time.time()
 
-if __name__ == "__main__":
     execution_time = end_time - start_time
     print("Script completed normally.")
     print("Script runtime: " + str(datetime.timedelta(seconds=execution_time)))
 
-    time.sleep(10)
-    driver.close()
+    if driver is not None:
+        time.sleep(10)
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
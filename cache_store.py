@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+"""
+compact binary house cache
+
+replaces the pickled list of {houseid: index} dicts written by cache.py. The file
+has a versioned header with a fingerprint of the island map, followed by flat NumPy
+arrays that are memory-mapped on load:
+
+    offsets         int64[num_cities + 1]   house_ids[offsets[c]:offsets[c + 1]] are city c's houses
+    max_ids         int32[num_cities]       largest house id per city
+    lookup_offsets  int64[num_cities + 1]   start of each city's id -> index table
+    house_ids       int32[num_houses]       house ids in page order (position = sample index)
+    lookup          int32[lookup_len]       sample index of each house id, -1 if there is no such house
+    city_hashes     uint8[num_cities * 32]  fingerprint of each city (house count and house ids)
+    hrefs           uint8[hrefs_len]        newline separated village hrefs, utf-8
+
+so "max house" and "is this house id valid" are single array reads, and
+`cache.py --refresh` can tell which cities changed since the last crawl.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+import numpy as np
+
+import hashlib
+import os
+import pickle
+import struct
+
+################################################################################################################
+## CONSTANTS
+################################################################################################################
+
+CACHE_FILE = "cache.bin"
+LEGACY_CACHE_FILE = "cache"
+
+MAGIC = b"ISLCACHE"
+VERSION = 2
+
+# magic, version, num_cities, num_houses, lookup_len, hrefs_len, map fingerprint
+HEADER = struct.Struct("<8sIIQQQ32s")
+PREFIX = struct.Struct("<8sI")
+HASH_SIZE = 32
+
+################################################################################################################
+## HELPERS
+################################################################################################################
+
+
+class CacheFormatError(Exception):
+    """Raised when a cache file is missing, corrupt or from another format version"""
+
+
+def map_fingerprint(village_hrefs):
+    """Hash of the village links on index.php, which changes whenever the map does"""
+    return hashlib.sha256("\n".join(village_hrefs).encode()).digest()
+
+
+def city_fingerprint(house_ids):
+    """Hash of a city's house count and house ids in page order"""
+    text = f"{len(house_ids)}\n" + "\n".join(str(house) for house in house_ids)
+    return hashlib.sha256(text.encode()).digest()
+
+
+def padded(nbytes):
+    """Round up to 8 bytes so every array starts aligned"""
+    return (nbytes + 7) & ~7
+
+
+def layout(num_cities, num_houses, lookup_len, hrefs_len):
+    """(name, dtype, count, byte offset) of each array after the header"""
+    arrays = [
+        ("offsets", np.int64, num_cities + 1),
+        ("max_ids", np.int32, num_cities),
+        ("lookup_offsets", np.int64, num_cities + 1),
+        ("house_ids", np.int32, num_houses),
+        ("lookup", np.int32, lookup_len),
+        ("city_hashes", np.uint8, num_cities * HASH_SIZE),
+        ("hrefs", np.uint8, hrefs_len),
+    ]
+    position = HEADER.size
+    placed = []
+    for name, dtype, count in arrays:
+        placed.append((name, dtype, count, position))
+        position += padded(count * np.dtype(dtype).itemsize)
+    return placed, position
+
+
+################################################################################################################
+## WRITE
+################################################################################################################
+
+
+def build_arrays(house_id_lists):
+    """Turn per-city lists of house ids (in page order) into the flat cache arrays"""
+    counts = np.array([len(ids) for ids in house_id_lists], dtype=np.int64)
+    offsets = np.zeros(len(house_id_lists) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    house_ids = np.array(
+        [int(house) for ids in house_id_lists for house in ids], dtype=np.int32
+    )
+    max_ids = np.array(
+        [max((int(house) for house in ids), default=0) for ids in house_id_lists],
+        dtype=np.int32,
+    )
+
+    lookup_offsets = np.zeros(len(house_id_lists) + 1, dtype=np.int64)
+    np.cumsum(max_ids.astype(np.int64) + 1, out=lookup_offsets[1:])
+
+    lookup = np.full(int(lookup_offsets[-1]), -1, dtype=np.int32)
+    for city, start in enumerate(offsets[:-1]):
+        ids = house_ids[start : offsets[city + 1]]
+        lookup[lookup_offsets[city] + ids] = np.arange(len(ids), dtype=np.int32)
+
+    city_hashes = np.frombuffer(
+        b"".join(city_fingerprint(ids) for ids in house_id_lists), dtype=np.uint8
+    )
+
+    return {
+        "offsets": offsets,
+        "max_ids": max_ids,
+        "lookup_offsets": lookup_offsets,
+        "house_ids": house_ids,
+        "lookup": lookup,
+        "city_hashes": city_hashes,
+    }
+
+
+def write_cache(house_id_lists, village_hrefs, path=CACHE_FILE):
+    """Write the cache atomically: per-city house ids in page order plus the map's village hrefs"""
+    arrays = build_arrays(house_id_lists)
+    arrays["hrefs"] = np.frombuffer("\n".join(village_hrefs).encode(), dtype=np.uint8)
+    num_cities = len(house_id_lists)
+    num_houses = len(arrays["house_ids"])
+    lookup_len = len(arrays["lookup"])
+    hrefs_len = len(arrays["hrefs"])
+    placed, size = layout(num_cities, num_houses, lookup_len, hrefs_len)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as cache_file:
+        cache_file.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                num_cities,
+                num_houses,
+                lookup_len,
+                hrefs_len,
+                map_fingerprint(village_hrefs),
+            )
+        )
+        for name, dtype, count, position in placed:
+            cache_file.seek(position)
+            cache_file.write(arrays[name].astype(dtype).tobytes())
+        cache_file.truncate(size)
+    os.replace(tmp_path, path)
+
+
+################################################################################################################
+## READ
+################################################################################################################
+
+
+class HouseCache:
+    """Memory-mapped view of a cache file (or of arrays built in memory)"""
+
+    def __init__(self, arrays, fingerprint=b"", version=VERSION):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.offsets = arrays["offsets"]
+        self.max_ids = arrays["max_ids"]
+        self.lookup_offsets = arrays["lookup_offsets"]
+        self.ids = arrays["house_ids"]
+        self.lookup = arrays["lookup"]
+        self.city_hashes = arrays["city_hashes"]
+
+        # Legacy caches don't know their village hrefs
+        hrefs = bytes(arrays["hrefs"]).decode() if "hrefs" in arrays else None
+        self.village_hrefs = hrefs.split("\n") if hrefs else None
+
+    @classmethod
+    def open(cls, path=CACHE_FILE):
+        """Check the header and memory-map the arrays of a cache file"""
+        try:
+            with open(path, "rb") as cache_file:
+                header = cache_file.read(HEADER.size)
+        except FileNotFoundError:
+            raise CacheFormatError(f"{path} not found. Run cache.py first.")
+        if len(header) < PREFIX.size:
+            raise CacheFormatError(f"{path} is truncated")
+
+        # Check magic and version before trusting the rest of the header
+        magic, version = PREFIX.unpack_from(header)
+        if magic != MAGIC:
+            raise CacheFormatError(f"{path} is not a house cache")
+        if version != VERSION:
+            raise CacheFormatError(
+                f"{path} is cache format version {version}, expected {VERSION}. Rerun cache.py."
+            )
+        if len(header) < HEADER.size:
+            raise CacheFormatError(f"{path} is truncated")
+        _, _, num_cities, num_houses, lookup_len, hrefs_len, fingerprint = (
+            HEADER.unpack(header)
+        )
+
+        placed, size = layout(num_cities, num_houses, lookup_len, hrefs_len)
+        if os.path.getsize(path) < size:
+            raise CacheFormatError(f"{path} is truncated")
+
+        arrays = {}
+        for name, dtype, count, position in placed:
+            if count == 0:
+                # np.memmap refuses empty arrays
+                arrays[name] = np.zeros(0, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode="r", offset=position, shape=(count,)
+                )
+        return cls(arrays, fingerprint, version)
+
+    def __len__(self):
+        return len(self.max_ids)
+
+    def house_ids(self, city):
+        """House ids of a city in page order"""
+        return self.ids[self.offsets[city] : self.offsets[city + 1]]
+
+    def num_houses(self, city):
+        return int(self.offsets[city + 1] - self.offsets[city])
+
+    def max_house(self, city):
+        return int(self.max_ids[city])
+
+    def sample_index(self, city, house_id):
+        """Position of a house id on its village page, or None if the city has no such house"""
+        if house_id < 0 or house_id > self.max_ids[city]:
+            return None
+        index = int(self.lookup[self.lookup_offsets[city] + house_id])
+        return index if index >= 0 else None
+
+    def has_house(self, city, house_id):
+        return self.sample_index(city, house_id) is not None
+
+    def city_fingerprint(self, city):
+        return bytes(self.city_hashes[city * HASH_SIZE : (city + 1) * HASH_SIZE])
+
+    def matches(self, village_hrefs):
+        """True if the cache was built for this map"""
+        return self.fingerprint == map_fingerprint(village_hrefs)
+
+
+def changed_cities(previous, house_id_lists, village_hrefs):
+    """Indices of the cities that are new or differ from a previous cache
+
+    a city counts as unchanged only if it has the same village href at the same index and
+    the same fingerprint, so census shards of unchanged cities can be kept as they are
+    """
+    if previous is None or previous.village_hrefs is None:
+        return list(range(len(house_id_lists)))
+
+    changed = []
+    for city, (house_ids, href) in enumerate(zip(house_id_lists, village_hrefs)):
+        if (
+            city >= len(previous)
+            or previous.village_hrefs[city] != href
+            or previous.city_fingerprint(city) != city_fingerprint(house_ids)
+        ):
+            changed.append(city)
+    return changed
+
+
+def load_house_cache(path=CACHE_FILE, legacy_path=LEGACY_CACHE_FILE):
+    """Load the binary cache, converting a legacy pickled cache in memory if that is all there is"""
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        print(f"Converting legacy {legacy_path} file, rerun cache.py to write {path}")
+        with open(legacy_path, "rb") as cache_file:
+            legacy = pickle.load(cache_file)
+        return HouseCache(build_arrays([list(hashid.keys()) for hashid in legacy]))
+    return HouseCache.open(path)
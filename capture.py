@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+"""
+api replies read off the network
+
+with ISLANDS_CAPTURE=1, Chrome records its DevTools network events (see session.py).
+NetworkCapture picks out the replies of the consent, task and chat endpoints and
+parses their JSON bodies. A stage can then take "did they consent", "did the task
+start" and the chat reply straight from the response, the moment it arrives,
+instead of waiting for the page to render it.
+
+the endpoints and reply fields are the ones mock_server.py serves; the live site's
+haven't been checked, so they can be set with ISLANDS_CAPTURE_ENDPOINTS. The page
+is watched at the same time and whichever answers first is used, so when nothing
+is captured a stage behaves as it does without ISLANDS_CAPTURE.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from selenium.common.exceptions import WebDriverException
+
+from urllib.parse import urlparse
+
+import json
+import time
+import os
+
+from session import CAPTURE
+from tracing import span
+from waits import start_watch
+
+################################################################################################################
+## CONSTANTS
+################################################################################################################
+
+# The endpoints whose replies are captured, by the kind of reply they carry (as mock_server.py
+# serves them), e.g. ISLANDS_CAPTURE_ENDPOINTS=consent=api/consent.php,chat=api/chat.php
+API_ENDPOINTS = {
+    "consent": "api/consent.php",
+    "task": "api/task.php",
+    "chat": "api/chat.php",
+}
+for setting in os.environ.get("ISLANDS_CAPTURE_ENDPOINTS", "").split(","):
+    if "=" in setting:
+        kind, endpoint = setting.split("=", 1)
+        API_ENDPOINTS[kind.strip()] = endpoint.strip().lstrip("/")
+
+# The field a reply of each kind must carry to be used; any other reply is left to the page
+REPLY_FIELDS = {"consent": "consented", "task": "started", "chat": "text"}
+
+TIMEOUT = 10  # seconds to wait for a reply
+POLL = 0.05  # seconds between reads of the network log
+
+# Click arguments[0], an element or the first match of a CSS selector, returning whether there was one
+CLICK_SCRIPT = r"""
+var target = typeof arguments[0] === 'string' ? document.querySelector(arguments[0]) : arguments[0];
+if (!target) { return false; }
+target.click();
+return true;
+"""
+
+# What the page watcher started by waits.start_watch saw, or null while it is still waiting
+PAGE_OUTCOME_SCRIPT = "return window.islandsOutcome || null;"
+
+################################################################################################################
+## CAPTURE
+################################################################################################################
+
+
+class NetworkCapture:
+    """The parsed JSON replies of API_ENDPOINTS, read from one driver's performance log"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.requests = {}  # requestId -> kind, for replies whose body hasn't finished loading
+        self.replies = []  # (kind, reply) read but not taken yet
+        self.captured = set()  # kinds a reply has been captured for
+        self.warned = set()  # kinds the page answered for while none had been
+
+    @staticmethod
+    def kind_of(url):
+        path = urlparse(url).path
+        for kind, endpoint in API_ENDPOINTS.items():
+            if path.endswith("/" + endpoint) or path == endpoint:
+                return kind
+        return None
+
+    def body(self, request_id):
+        """The parsed JSON body of a finished response, or None if it can't be read"""
+        try:
+            body = self.driver.execute_cdp_cmd(
+                "Network.getResponseBody", {"requestId": request_id}
+            )["body"]
+            return json.loads(body)
+        except (WebDriverException, ValueError, KeyError) as e:
+            print(f"Could not read captured reply: {e}")
+            return None
+
+    def drain(self):
+        """Read the network events since the last call, keeping the replies of API_ENDPOINTS"""
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            params = message.get("params", {})
+            if message["method"] == "Network.responseReceived":
+                kind = self.kind_of(params["response"]["url"])
+                if kind is not None:
+                    self.requests[params["requestId"]] = kind
+            elif message["method"] == "Network.loadingFinished":
+                kind = self.requests.pop(params["requestId"], None)
+                if kind is not None:
+                    reply = self.body(params["requestId"])
+                    if reply is not None:
+                        self.replies.append((kind, reply))
+
+    def clear(self):
+        """Forget every reply so far, so the next wait only sees what comes after"""
+        self.drain()
+        self.replies = []
+
+    def take(self, kind):
+        """The first reply of kind carrying its REPLY_FIELDS field, dropping any without it"""
+        for index, (reply_kind, reply) in enumerate(self.replies):
+            if reply_kind == kind:
+                del self.replies[index]
+                if isinstance(reply, dict) and REPLY_FIELDS.get(kind, "text") in reply:
+                    return reply
+                return self.take(kind)
+        return None
+
+    def click(self, target, kind, timeout=TIMEOUT, fallback=None):
+        """Click target and wait for what it triggers, shaped like waits.watch_task's outcome
+
+        the reply off the network and the page are watched together and whichever answers first
+        is used: event "reply" carries the parsed JSON as reply, anything else is the page's
+        outcome (watch_task's, or fallback(driver)'s when given, polled until it isn't None).
+        "missing" means there was nothing to click
+        """
+        with span(f"capture {kind}"):
+            self.clear()
+            if fallback is None:
+                # The page watcher does the click, and leaves its outcome for PAGE_OUTCOME_SCRIPT
+                if not start_watch(self.driver, target, timeout):
+                    return {"event": "missing", "text": "", "detail": "", "reply": None}
+
+                def fallback(driver):
+                    return driver.execute_script(PAGE_OUTCOME_SCRIPT)
+
+            elif not self.driver.execute_script(CLICK_SCRIPT, target):
+                return {"event": "missing", "text": "", "detail": "", "reply": None}
+
+            deadline = time.time() + timeout
+            while True:
+                self.drain()
+                reply = self.take(kind)
+                if reply is not None:
+                    self.captured.add(kind)
+                    text = str(reply.get("text", ""))
+                    return {"event": "reply", "text": text, "detail": "", "reply": reply}
+                outcome = fallback(self.driver)
+                if outcome is not None:
+                    if kind not in self.captured and kind not in self.warned:
+                        self.warned.add(kind)
+                        print(
+                            f"No {kind} reply captured from {API_ENDPOINTS.get(kind)}, using the page "
+                            "(see ISLANDS_CAPTURE_ENDPOINTS)"
+                        )
+                    return dict(outcome, reply=None)
+                if time.time() > deadline:
+                    print(f"Timed out after {timeout}s waiting for a {kind} reply")
+                    return {"event": "timeout", "text": "", "detail": "", "reply": None}
+                time.sleep(POLL)
+
+
+def consented(outcome):
+    """Whether a consent click was accepted, from a captured reply or the result row watch_task saw"""
+    if outcome["event"] == "reply":
+        return bool(outcome["reply"].get("consented"))
+    return "consented" in outcome["text"]
+
+
+# One capture per Chrome session, so replies read by one stage aren't lost to the next
+CAPTURES = {}
+
+
+def capture_for(driver):
+    """The NetworkCapture of driver, or None when ISLANDS_CAPTURE is off"""
+    if not CAPTURE:
+        return None
+    if driver.session_id not in CAPTURES:
+        CAPTURES[driver.session_id] = NetworkCapture(driver)
+    return CAPTURES[driver.session_id]
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+"""
+full population census of The Islands
+
+visits every house and every islander once over HTTP and stores their details as a
+columnar dataset: one .npy file per column in the census/ directory. Cities are
+written to census/shards/ as they finish, so an interrupted crawl resumes where it
+stopped. Run it with `python3 cache.py --census`; `python3 cache.py --refresh`
+recrawls only the cities whose village page changed.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+import numpy as np
+
+import asyncio
+import datetime
+import json
+import os
+
+from http_backend import AsyncHttpBackend, parse_stats
+
+################################################################################################################
+## CONSTANTS
+################################################################################################################
+
+CENSUS_DIR = "census"
+
+# Column name -> dtype once consolidated (strings are stored as fixed-width unicode)
+CENSUS_COLUMNS = {
+    "city_index": np.int32,
+    "sample_index": np.int32,
+    "person_index": np.int32,
+    "village_href": str,
+    "islander_href": str,
+    "name": str,
+    "age": np.int16,
+    "education_level": str,
+    "income": np.int64,
+    "island": str,
+    "house_num": np.int32,
+}
+
+################################################################################################################
+## HELPERS
+################################################################################################################
+
+
+def to_int(value, default=-1):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def shard_path(directory, city_index):
+    return os.path.join(directory, "shards", f"city_{city_index:04d}.npz")
+
+
+def save_shard(directory, city_index, records):
+    """Write one city's islanders atomically, so a crash never leaves half a shard"""
+    columns = {
+        name: np.array([record[name] for record in records], dtype=dtype)
+        for name, dtype in CENSUS_COLUMNS.items()
+    }
+    path = shard_path(directory, city_index)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as shard_file:
+        np.savez(shard_file, **columns)
+    os.replace(tmp_path, path)
+
+
+def discard_shards(directory, city_indices):
+    """Delete the shards of cities that changed, so the next crawl takes their census again"""
+    discarded = 0
+    for city_index in city_indices:
+        path = shard_path(directory, city_index)
+        if os.path.exists(path):
+            os.remove(path)
+            discarded += 1
+    return discarded
+
+
+################################################################################################################
+## CRAWL
+################################################################################################################
+
+
+async def crawl_city(backend, city_index, directory):
+    """Fetch every house and islander of one city and save them as a shard
+
+    a city with any house or islander that couldn't be read isn't saved, so the next run
+    crawls it again instead of taking the partial shard as done
+    """
+    village_href = (await backend.village_hrefs())[city_index]
+    village = await backend.village(city_index)
+
+    houses = await asyncio.gather(
+        *(
+            backend.residents(village, sample_index)
+            for sample_index in range(len(village["house_hrefs"]))
+        ),
+        return_exceptions=True,
+    )
+
+    errors = 0
+    jobs = []
+    for sample_index, residents in enumerate(houses):
+        if isinstance(residents, Exception):
+            print(f"Error reading house {sample_index} of {village['title']}: {residents}")
+            errors += 1
+            continue
+        for person_index, href in enumerate(residents):
+            jobs.append((sample_index, person_index, href))
+
+    islanders = await asyncio.gather(
+        *(backend.islander(href) for _, _, href in jobs), return_exceptions=True
+    )
+
+    records = []
+    for (sample_index, person_index, href), islander in zip(jobs, islanders):
+        if isinstance(islander, Exception):
+            print(f"Error reading islander {href}: {islander}")
+            errors += 1
+            continue
+        stats = parse_stats(islander["stats"])
+        records.append(
+            {
+                "city_index": city_index,
+                "sample_index": sample_index,
+                "person_index": person_index,
+                "village_href": village_href,
+                "islander_href": href,
+                "name": islander["name"],
+                "age": to_int(stats["age"]),
+                "education_level": stats["education_level"],
+                "income": to_int(stats["income"]),
+                "island": stats["island"],
+                "house_num": to_int(stats["house_num"]),
+            }
+        )
+
+    if errors:
+        print(
+            f"Census of {village['title'].capitalize()} incomplete ({errors} errors), "
+            "not saved: rerun to crawl it again"
+        )
+        return
+
+    save_shard(directory, city_index, records)
+    print(f"Census of {village['title'].capitalize()}: {len(records)} islanders")
+
+
+async def crawl(session_id, concurrency, directory):
+    async with AsyncHttpBackend(session_id, concurrency=concurrency) as backend:
+        await backend.login()
+        num_cities = len(await backend.village_hrefs())
+
+        todo = [
+            city_index
+            for city_index in range(num_cities)
+            if not os.path.exists(shard_path(directory, city_index))
+        ]
+        print(f"Census: {num_cities - len(todo)} of {num_cities} cities already done")
+
+        results = await asyncio.gather(
+            *(crawl_city(backend, city_index, directory) for city_index in todo),
+            return_exceptions=True,
+        )
+        for city_index, result in zip(todo, results):
+            if isinstance(result, Exception):
+                print(f"Error taking census of city {city_index}: {result}")
+
+    return num_cities
+
+
+def consolidate(directory, num_cities):
+    """Join the city shards into one .npy file per column"""
+    shards = []
+    for city_index in range(num_cities):
+        path = shard_path(directory, city_index)
+        if os.path.exists(path):
+            with np.load(path) as shard:
+                shards.append({name: shard[name] for name in CENSUS_COLUMNS})
+        else:
+            print(f"Warning: city {city_index} missing from census, rerun to resume")
+
+    for name, dtype in CENSUS_COLUMNS.items():
+        parts = [shard[name] for shard in shards]
+        column = np.concatenate(parts) if parts else np.array([], dtype=dtype)
+        np.save(os.path.join(directory, f"{name}.npy"), column)
+
+    num_islanders = sum(len(shard["city_index"]) for shard in shards)
+    meta = {
+        "num_cities": num_cities,
+        "cities_done": len(shards),
+        "num_islanders": num_islanders,
+        "columns": list(CENSUS_COLUMNS),
+        "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(directory, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    return meta
+
+
+def run_census(session_id, concurrency=8, directory=CENSUS_DIR, stale=()):
+    """Crawl (or resume) the census and write the columnar dataset
+
+    cities listed in stale are crawled again even if they already have a shard
+    """
+    os.makedirs(os.path.join(directory, "shards"), exist_ok=True)
+    discarded = discard_shards(directory, stale)
+    if discarded:
+        print(f"Census: recrawling {discarded} changed cities")
+    num_cities = asyncio.run(crawl(session_id, concurrency, directory))
+    meta = consolidate(directory, num_cities)
+    print(
+        f"Census has {meta['num_islanders']} islanders from {meta['cities_done']} of {num_cities} cities"
+    )
+    return meta
+
+
+################################################################################################################
+## LOAD
+################################################################################################################
+
+
+def load_census(directory=CENSUS_DIR):
+    """Memory-map every census column, returning (columns, meta) or None if there is no census"""
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path, "r") as meta_file:
+        meta = json.load(meta_file)
+
+    columns = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        for name in meta["columns"]
+    }
+    return columns, meta
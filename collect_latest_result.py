@@ -4,459 +4,239 @@
 ## IMPORTS
 ################################################################################################################
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    TimeoutException,
-    NoSuchElementException,
-    StaleElementReferenceException,
-)
 
-import pandas as pd
 import time
 import datetime
-import os
-
-start_time = time.time()
-
+import argparse
+
+from session import INDEX_URL, read_session_id, start_logged_in_driver
+from http_backend import HttpBackend
+from navigation import load_participant_rows, open_islander, plan_visits
+from journal import Journal
+from results_store import ResultsStore
+from tracing import span
+from extract import extract_islander
+from waits import page_ready, tab_ready
+
+parser = argparse.ArgumentParser(description="Collect the latest task result of every participant")
+parser.add_argument(
+    "--http",
+    action="store_true",
+    help="read the islander pages over HTTP instead of driving Chrome",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="finish the collection round an interrupted run started instead of starting a new one",
+)
 ################################################################################################################
 ## HELPERS
 ################################################################################################################
 
 
-# Save data as we go with automatic file numbering
-def get_available_filename(base_name, extension=".csv"):
-    """Find an available filename by appending numbers if the file exists"""
-    if not os.path.exists(f"{base_name}{extension}"):
-        return f"{base_name}{extension}"
-
-    counter = 1
-    while os.path.exists(f"{base_name}{counter}{extension}"):
-        counter += 1
-
-    return f"{base_name}{counter}{extension}"
+def print_round(store, round):
+    """Show a collected round and return it in participant order"""
+    data = store.round_results(round)
+    print(data.head())
+    print(f"Round {round} saved to {store.path} ({len(data)} participants)")
+    return data
 
 
 ################################################################################################################
-## LOGIN
+## HTTP COLLECTION
 ################################################################################################################
 
-chrome_options = Options()
-chrome_options.add_experimental_option("detach", True)
-chrome_options.add_argument("--start-maximized")  # Still useful for viewport size
-chrome_options.add_argument("--headless=new")  # This runs Chrome in background
-chrome_options.add_argument("--disable-gpu")  # Recommended for headless
-chrome_options.add_argument("--window-size=1920,1080")  # Set viewport explicitly
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-
-# Initialize the driver
-driver = webdriver.Chrome(options=chrome_options)
-
-# Read session cookie from file
-try:
-    with open("session_cookie", "r") as cookie_file:
-        session_id = cookie_file.read().strip()
-        print(f"Read session ID from file: {session_id}")
-except FileNotFoundError:
-    print(
-        "Error: session_cookie file not found. Please create this file with your session ID."
-    )
-    driver.quit()
-    exit(1)
-except Exception as e:
-    print(f"Error reading session_cookie file: {e}")
-    driver.quit()
-    exit(1)
-
-# Check if session ID is empty
-if not session_id:
-    print(
-        "Error: session_cookie file is empty. Please add your session ID to this file."
-    )
-    driver.quit()
-    exit(1)
-
-# Navigate to the login page
-driver.get("https://islands.smp.uq.edu.au/login.php")
-
-# Wait for page to load
-driver.implicitly_wait(1)
-
-# Get the current PHPSESSID cookie (if it exists)
-phpsessid_cookie = driver.get_cookie("PHPSESSID")
-print(phpsessid_cookie)
-
-# If the cookie doesn't exist yet, create a new one
-if not phpsessid_cookie:
-    print("PHPSESSID cookie not found, creating new one")
-    # Use session ID from file
-    driver.add_cookie(
-        {
-            "name": "PHPSESSID",
-            "value": session_id,
-            "path": "/",
-            "domain": "islands.smp.uq.edu.au",
-        }
-    )
-else:
-    # Modify the existing cookie
-    print(f"Found existing PHPSESSID: {phpsessid_cookie['value']}")
-    # Replace with session ID from file
-    driver.delete_cookie("PHPSESSID")
-    driver.add_cookie(
-        {
-            "name": "PHPSESSID",
-            "value": session_id,
-            "path": "/",
-            "domain": "islands.smp.uq.edu.au",
-        }
-    )
-
-# Verify the cookie was set
-updated_cookie = driver.get_cookie("PHPSESSID")
-print(f"Updated PHPSESSID: {updated_cookie['value']}")
-
-# Refresh the page to apply the cookie
-driver.get("https://islands.smp.uq.edu.au/index.php")
-driver.implicitly_wait(3)
-
-# Check if login was successful
-if "login.php" in driver.current_url:
-    print("Login failed - still on login page. Check if your session ID is valid.")
-    driver.quit()
-    exit(1)
-else:
-    print("Successfully logged in!")
-
-# Set up a WebDriverWait object for explicit waits
-wait = WebDriverWait(driver, 10)
 
-################################################################################################################
-## ENUMERATE CONSTANTS AND GLOBAL VARS(LOAD INDEX DATA TOO)
-################################################################################################################
+def collect_result_http(backend, row):
+    """Read one participant's latest result without a browser"""
+    name = "NA"
+    result = 0
 
-# making dataframe
-df = pd.read_csv("participant_ids.csv")
-city_index = df["city_index"]
-sample_index = df["sample_index"]
-person_index = df["person_index"]
+    href = row["islander_href"]
+    if href is None:
+        href = backend.resolve_islander(
+            row["city_index"], row["sample_index"], row["person_index"]
+        )
+    islander = backend.islander(href)
+    print("touched " + islander["title"])
 
-SAMPLE_SIZE = len(df)
-people_sampled = 0
+    name = islander["name"]
+    if len(islander["results"]) > 0:
+        result = islander["results"][0]
 
-try:
-    cities = wait.until(
-        EC.presence_of_all_elements_located(
-            (By.XPATH, '//a[starts-with(@href, "village")]')
-        )
-    )
-    NUM_CITIES = len(cities)
+    return name, result
 
-    buttons = []
-    for j in cities:
-        try:
-            button = j.find_element(
-                By.XPATH, './/div[starts-with(@class, "town town")]'
-            )
-            buttons.append(button)
-        except NoSuchElementException:
-            try:
-                button = j.find_element(
-                    By.XPATH, './/div[starts-with(@class, "towndot towndot")]'
-                )
-                buttons.append(button)
-            except NoSuchElementException:
-                print(
-                    f"Warning: Could not find button for city {j.get_attribute('href')}"
-                )
-
-    print(f"Found {len(buttons)} cities out of {NUM_CITIES}")
-    assert len(buttons) > 0
-except Exception as e:
-    print(f"Error finding cities: {e}")
-    driver.quit()
-    exit(1)
-
-# make data vectors
-name_vec = []
-result_vec = []
 
 ################################################################################################################
-## RUNTIME BODY
+## SELENIUM COLLECTION
 ################################################################################################################
 
-for df_count in range(0, SAMPLE_SIZE):
-    try:
-        print(f"\nProcessing participant {df_count+1}/{SAMPLE_SIZE}")
 
-        ## window check 1
-        # Store the ID of the original window
-        original_window = driver.current_window_handle
+def collect_result(driver, wait, row, visited=None):
+    """Open one participant in Chrome and read their latest result
 
-        # Loop through until we find a new window handle
-        if (
-            driver.current_window_handle == original_window
-            and len(driver.window_handles) > 1
-        ):
-            driver.close()
+    visited carries the village and house pages from one participant to the next (see open_islander)
+    """
+    name = "NA"
+    result = 0
 
-        driver.switch_to.window(driver.window_handles[0])
+    try:
+        if not open_islander(driver, wait, row, visited):
+            # Go back to the index page
+            driver.get(INDEX_URL)
+            page_ready(driver, "index")
+            return name, result
 
-        # Check we don't have other windows open already
-        assert len(driver.window_handles) == 1
+        ### Perform Data Collection ###
+        try:
+            # Get the person's name
+            isl = wait.until(EC.presence_of_element_located((By.ID, "title")))
+            print("touched " + isl.text)
 
-        # Make sure we're on the islands page
-        if "index.php" not in driver.current_url:
-            print("Not on index page, navigating back")
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
+            # Try to click on "Tasks" tab if present
+            try:
+                tab = wait.until(EC.element_to_be_clickable((By.ID, "t2tab")))
+                with span("tab switch", tab="t2tab"):
+                    tab.click()
+                    tab_ready(driver, 2)
+            except Exception as e:
+                print(f"Error clicking tasks tab: {e}")
 
-        # Re-fetch cities and buttons to prevent stale elements
-        try:
-            cities = wait.until(
-                EC.presence_of_all_elements_located(
-                    (By.XPATH, '//a[starts-with(@href, "village")]')
-                )
-            )
-            buttons = []
-            for j in cities:
-                try:
-                    button = j.find_element(
-                        By.XPATH, './/div[starts-with(@class, "town town")]'
-                    )
-                    buttons.append(button)
-                except NoSuchElementException:
-                    try:
-                        button = j.find_element(
-                            By.XPATH, './/div[starts-with(@class, "towndot towndot")]'
-                        )
-                        buttons.append(button)
-                    except NoSuchElementException:
-                        continue
-
-            # Check if we have a valid city index
-            current_city_index = city_index[df_count]
-            if current_city_index < 0 or current_city_index >= len(buttons):
-                print(
-                    f"Warning: City index {current_city_index} out of range, skipping"
-                )
-
-                # Initialize empty data for skipped entries
-                name_vec.append("NA")
-                result_vec.append(0)
-                continue
-
-            # Click on the city
-            click_btn = ActionChains(driver)
-            click_btn.move_to_element(buttons[current_city_index])
-            click_btn.click()
-            click_btn.perform()
-            time.sleep(2)
+            # Get the name from the header and the latest result in one round trip
+            try:
+                islander = extract_islander(driver)
+                name = islander["name"]
+                if len(islander["results"]) > 0:
+                    result = islander["results"][0]
+            except Exception as e:
+                print(f"Error getting result info: {e}")
 
         except Exception as e:
-            print(f"Error finding/clicking city: {e}")
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
-            continue
+            print(f"Error collecting person data: {e}")
 
-        ## window check 2
-        # Store the ID of the original window
-        original_window = driver.current_window_handle
+    except Exception as e:
+        print(f"Error finding participant: {e}")
+
+    return name, result
 
-        # Loop through until we find a new window handle
-        if (
-            driver.current_window_handle == original_window
-            and len(driver.window_handles) > 1
-        ):
-            driver.close()
 
-        driver.switch_to.window(driver.window_handles[0])
+################################################################################################################
+## STAGE
+################################################################################################################
 
-        # Check we don't have other windows open already
-        assert len(driver.window_handles) == 1
 
-        # initialize vars
-        name = "NA"
-        result = 0
+def collect_latest_results(use_http=False, resume=False, driver=None):
+    """Read every participant's latest result into a new round of the results store
+
+    every result is upserted into results.db and journaled as it is read, and resume finishes
+    an interrupted round instead of starting a new one. A
+    logged-in driver can be passed in to reuse it, otherwise one is started (unless use_http)
+    and left for the caller in the returned (data, driver)
+    """
+    # making dataframe
+    rows = load_participant_rows("participant_ids.csv")
+
+    SAMPLE_SIZE = len(rows)
+
+    # Positions an interrupted round already collected (their results are in the store)
+    journal = Journal("collect_latest_result", resume)
+    collected = {entry["position"] for entry in journal.entries}
+    if journal.finished:
+        # This round was already saved
+        journal.close()
+        return None, driver
+
+    store = ResultsStore()
+    store.add_participants(rows)
+    if journal.entries:
+        round = journal.entries[0]["round"]
+    else:
+        round = store.next_round()
+    print(f"Collecting round {round}")
+
+    backend = None
+    if use_http:
+        backend = HttpBackend(read_session_id())
+        backend.login()
+    else:
+        if driver is None:
+            driver = start_logged_in_driver()
+        # Set up a WebDriverWait object for explicit waits
+        wait = WebDriverWait(driver, 10)
+
+    # City by city, so consecutive participants share their village and house pages; the
+    # round is still printed in participant_ids.csv order
+    visited = {}
+    for row in plan_visits(rows):
+        df_count = row["position"]
+        if df_count in collected:
+            continue
+        print(f"\nProcessing participant {df_count+1}/{SAMPLE_SIZE}")
 
         try:
-            # Wait for houses to load
-            houses = wait.until(
-                EC.presence_of_all_elements_located((By.CLASS_NAME, "house"))
-            )
-
-            # Check if the sample index is valid
-            current_sample_index = sample_index[df_count]
-            if current_sample_index < 0 or current_sample_index >= len(houses):
-                print(
-                    f"Warning: House index {current_sample_index} out of range, skipping"
-                )
-
-                # Initialize empty data for skipped entries
-                name_vec.append("NA")
-                result_vec.append(0)
-
-                # Go back to the index page
-                driver.get("https://islands.smp.uq.edu.au/index.php")
-                time.sleep(2)
-                continue
-
-            # Click the house
-            houses[current_sample_index].click()
-            time.sleep(2)
-
-            # Wait for resident links to load
-            try:
-                resident_links = wait.until(
-                    EC.presence_of_all_elements_located(
-                        (By.XPATH, '//a[starts-with(@href, "islander.php")]')
-                    )
-                )
-                num_residents = len(resident_links)
-
-                if num_residents == 0:
-                    print("Empty house, no residents found")
-
-                    # Initialize empty data for skipped entries
-                    name_vec.append("NA")
-                    result_vec.append(0)
-
-                    # Go back to the index page
-                    driver.get("https://islands.smp.uq.edu.au/index.php")
-                    time.sleep(2)
-                    continue
-
-                # Check if person index is valid
-                current_person_index = person_index[df_count]
-                if current_person_index < 0 or current_person_index >= num_residents:
-                    print(
-                        f"Warning: Person index {current_person_index} out of range, using index 0"
-                    )
-                    current_person_index = 0
-
-                # Click on the person
-                resident_links[current_person_index].click()
-                time.sleep(2)
-
-                ### Perform Data Collection ###
-                try:
-                    # Get the person's name
-                    isl = wait.until(EC.presence_of_element_located((By.ID, "title")))
-                    print("touched " + isl.text)
-
-                    # Get name from header
-                    try:
-                        header = driver.find_element(
-                            By.CLASS_NAME, "crumb"
-                        ).text.split()
-                        if len(header) >= 3:
-                            name = header[1] + " " + header[2]
-                    except Exception as e:
-                        print(f"Error getting name: {e}")
-
-                    # Try to click on "Tasks" tab if present
-                    try:
-                        tab = wait.until(EC.element_to_be_clickable((By.ID, "t2tab")))
-                        tab.click()
-                        time.sleep(1)
-
-                        # Get result information
-                        try:
-                            task_results = driver.find_elements(
-                                By.CLASS_NAME, "taskresultresult"
-                            )
-
-                            if task_results and len(task_results) > 0:
-                                result = task_results[0].text
-                        except Exception as e:
-                            print(f"Error getting result info: {e}")
-                    except Exception as e:
-                        print(f"Error clicking tasks tab: {e}")
-
-                except Exception as e:
-                    print(f"Error collecting person data: {e}")
-
-            except Exception as e:
-                print(f"Error finding residents: {e}")
+            with span("participant", position=df_count):
+                if use_http:
+                    name, result = collect_result_http(backend, row)
+                else:
+                    name, result = collect_result(driver, wait, row, visited)
         except Exception as e:
-            print(f"Error finding houses: {e}")
+            print(f"Unexpected error processing result for participant {df_count+1}: {e}")
+            name, result = "NA", 0
+
+            # Try to get back to the index
+            if not use_http:
+                try:
+                    driver.get(INDEX_URL)
+                    page_ready(driver, "index")
+                except:
+                    print("Could not navigate back to index")
 
         # append the data
-        name_vec.append(name)
-        result_vec.append(result)
+        collected.add(df_count)
+        store.record_result(row, round, name, result)
+        journal.append(
+            {"position": df_count, "name": name, "result": result, "round": round}
+        )
 
         print(f"Collected latest result for participant {df_count+1}: {name}, result {result}")
 
-        # Return to home page
-        try:
-            # First try to click the menu button
-            try:
-                island_home = wait.until(
-                    EC.element_to_be_clickable((By.CLASS_NAME, "menu"))
-                )
-                island_home.click()
-                time.sleep(2)
-            except Exception:
-                # If that fails, navigate directly to index page
-                driver.get("https://islands.smp.uq.edu.au/index.php")
-                time.sleep(2)
-        except Exception as e:
-            print(f"Error returning to home: {e}")
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
+    if backend is not None:
+        backend.close()
 
-    except Exception as e:
-        print(f"Unexpected error processing result for participant {df_count+1}: {e}")
+    data = print_round(store, round)
+    store.close()
+    journal.finish()
 
-        # Add empty data for skipped entries
-        name_vec.append("NA")
-        result_vec.append(0)
+    return data, driver
 
-        # Try to get back to the index
-        try:
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
-        except:
-            print("Could not navigate back to index")
-
-## Create data frame and write to csv
-data = pd.DataFrame(
-    {
-        "name": name_vec,
-        "result": result_vec,
-    }
-)
 
-print(data.head())
+################################################################################################################
+## RUN
+################################################################################################################
 
-try:
-    # Get a filename that doesn't exist yet
-    filename = get_available_filename("latest_result")
-    data.to_csv(filename)
-    print(f"Data saved successfully to {filename}")
-except Exception as e:
-    print(f"Error saving data: {e}")
-    # Try to save to a backup location
-    try:
-        backup_filename = get_available_filename("latest_result_backup")
-        data.to_csv(backup_filename)
-        print(f"Data saved to backup file {backup_filename}")
-    except Exception as e:
-        print(f"Could not save data to backup file: {e}")
 
-end_time = time.time()
+def main():
+    args = parser.parse_args()
+
+    start_time = time.time()
+
+    data, driver = collect_latest_results(use_http=args.http, resume=args.resume)
+
+    end_time = time.time()
 
-if __name__ == "__main__":
     execution_time = end_time - start_time
     print("Script completed normally.")
     print("Script runtime: " + str(datetime.timedelta(seconds=execution_time)))
-    print(f"Results collected for {len(data)} participants")
+    if data is not None:
+        print(f"Results collected for {len(data)} participants")
 
-    time.sleep(5)
-    driver.close()
+    if driver is not None:
+        time.sleep(5)
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
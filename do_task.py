@@ -8,45 +8,24 @@ Script to run tasks on participants from participants_ids.csv with complete task
 ## IMPORTS
 ################################################################################################################
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    TimeoutException,
-    NoSuchElementException,
-    StaleElementReferenceException,
-)
+from selenium.common.exceptions import WebDriverException
 
-import pandas as pd
 import time
 import datetime
 import sys
+import argparse
 
-################################################################################################################
-## SETUP
-################################################################################################################
-
-start_time = time.time()
-
-chrome_options = Options()
-chrome_options.add_experimental_option("detach", True)
-chrome_options.add_argument("--start-maximized")  # Still useful for viewport size
-chrome_options.add_argument("--headless=new")  # This runs Chrome in background
-chrome_options.add_argument("--disable-gpu")  # Recommended for headless
-chrome_options.add_argument("--window-size=1920,1080")  # Set viewport explicitly
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-
-# Initialize the driver
-driver = webdriver.Chrome(options=chrome_options)
-wait = WebDriverWait(driver, 10)
-
-# Set up counter
-tasks_completed = 0
-tasks_failed = 0
+from session import INDEX_URL, read_session_id, start_logged_in_driver
+from navigation import load_participant_rows, open_islander, plan_visits
+from journal import Journal
+from results_store import ResultsStore
+from tracing import span
+from waits import page_ready, tab_ready, watch_task, start_watch, finish_watch
+from tabs import TabScheduler, run_steps
+from capture import capture_for, consented
 
 ################################################################################################################
 ## TASK MENU CONFIGURATION
@@ -426,19 +405,25 @@ task_menu = {
     },
 }
 
+# Named groups of task codes that can be started together in one visit
+TASK_BUNDLES = {
+    "vitals": ["bloodpressure", "pulse", "temperature", "spo2", "breathing"],
+    "body": ["height", "weight", "waist", "head"],
+    "reaction": ["ruler", "lightbulb"],
+    "hormones": ["cortisol", "bloodadrenaline", "testosterone", "estrogen"],
+}
+
+# Seconds to wait for a clicked task to show as started before giving up on it
+TASK_TIMEOUT = 5
+
 ################################################################################################################
 ## HELPERS
 ################################################################################################################
 
 
-def click_with_javascript(driver, element):
-    """Use JavaScript to click an element that might not be directly interactable"""
-    try:
-        driver.execute_script("arguments[0].click();", element)
-        return True
-    except Exception as e:
-        print(f"JavaScript click failed: {e}")
-        return False
+def task_selector(task_code):
+    """CSS selector of the span that starts a task, for watch_task to find and click"""
+    return f"span[onclick*=\"startTask('{task_code}')\"]"
 
 
 def toggle_submenu(driver, menu_id):
@@ -446,7 +431,6 @@ def toggle_submenu(driver, menu_id):
     try:
         script = f"if(document.getElementById('tasks{menu_id}')) {{ document.getElementById('tasks{menu_id}').style.display = 'block'; }}"
         driver.execute_script(script)
-        time.sleep(0.5)
         return True
     except Exception as e:
         print(f"Failed to toggle submenu: {e}")
@@ -467,116 +451,84 @@ def search_tasks(query):
     return results[0]
 
 
-def verify_task_started(driver):
-    """Check if a task has started by looking for the progress canvas"""
-    try:
-        # Check if detailbox is displayed
-        detailbox = driver.find_element(By.ID, "detailbox")
-        if detailbox.get_attribute("style") == "display: block;":
-            # Check for progress canvas
-            try:
-                progress_canvas = driver.find_element(By.ID, "progress")
-                if progress_canvas:
-                    # Get task details if available
-                    try:
-                        detail_text = driver.find_element(By.ID, "detail").text
-                        return True, detail_text
-                    except:
-                        return True, "Task in progress (no detail text)"
-            except:
-                pass
-
-        # Secondary check: look for recent task result
-        try:
-            task_results = driver.find_elements(By.CLASS_NAME, "taskresulttask")
-            if task_results and len(task_results) > 0:
-                return True, f"Task completed: {task_results[0].text}"
-        except:
-            pass
-
-        return False, "Could not verify task started"
-    except Exception as e:
-        return False, f"Error checking task progress: {e}"
+def find_task(query):
+    """The (category, task name, code) of a task, preferring an exact code over a name search"""
+    for category in task_menu:
+        for task_name, task_code in task_menu[category]["tasks"].items():
+            if task_code == query.lower():
+                return category, task_name, task_code
+    return search_tasks(query)
+
+
+def resolve_tasks(queries):
+    """Expand task names, codes, comma separated lists and bundle names into a list of tasks"""
+    tasks = []
+    for query in queries:
+        for part in query.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            for name in TASK_BUNDLES.get(part.lower(), [part]):
+                try:
+                    task = find_task(name)
+                except IndexError:
+                    print("Unable to find", name)
+                    sys.exit(1)
+                if task not in tasks:
+                    tasks.append(task)
+    return tasks
+
+
+def task_started(task, outcome):
+    """Whether a click started the task, from what watch_task saw happen
+
+    a task counts as started if the detail box or progress canvas showed it running, or if a
+    new task result names it (it finished before the box was seen); a captured reply says so
+    itself
+    """
+    category, task_name, task_code = task
+    if outcome["event"] == "reply":
+        return bool(outcome["reply"].get("started"))
+    if outcome["event"] == "running":
+        return True
+    if outcome["event"] == "result":
+        text = outcome["text"].lower()
+        return task_name.lower() in text or task_code in text
+    return False
 
 
 ################################################################################################################
-## LOGIN
+## LOAD SAMPLE DATA
 ################################################################################################################
 
-# Read session cookie from file
-try:
-    with open("session_cookie", "r") as cookie_file:
-        session_id = cookie_file.read().strip()
-        print(f"Read session ID from file: {session_id}")
-except FileNotFoundError:
-    print(
-        "Error: session_cookie file not found. Please create this file with your session ID."
-    )
-    driver.quit()
-    exit(1)
-
-# Navigate to the login page
-driver.get("https://islands.smp.uq.edu.au/login.php")
-driver.implicitly_wait(1)
-
-# Set the PHPSESSID cookie
-driver.delete_all_cookies()  # Clear existing cookies
-driver.add_cookie(
-    {
-        "name": "PHPSESSID",
-        "value": session_id,
-        "path": "/",
-        "domain": "islands.smp.uq.edu.au",
-    }
-)
 
-# Go to index page
-driver.get("https://islands.smp.uq.edu.au/index.php")
-time.sleep(2)
-
-# Check if login was successful
-if "login.php" in driver.current_url:
-    print("Login failed - still on login page. Check if your session ID is valid.")
-    driver.quit()
-    exit(1)
-else:
-    print("Successfully logged in!")
-
-################################################################################################################
-## LOAD SAMPLE DATA
-################################################################################################################
+def load_rows():
+    """Load the participants from participant_ids.csv, exiting if they can't be read"""
+    try:
+        rows = load_participant_rows("participant_ids.csv")
+        print(f"Loaded {len(rows)} participants from participant_ids.csv")
+    except FileNotFoundError:
+        print("Error: participants_id.csv not found. Please create this file first.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error loading participant data: {e}")
+        sys.exit(1)
+    return rows
 
-# Load the sample data from CSV
-try:
-    df = pd.read_csv("participant_ids.csv")
-    city_index = df["city_index"]
-    sample_index = df["sample_index"]
-    person_index = df["person_index"]
-
-    SAMPLE_SIZE = len(df)
-    print(f"Loaded {SAMPLE_SIZE} participants from participant_ids.csv")
-except FileNotFoundError:
-    print("Error: participants_id.csv not found. Please create this file first.")
-    driver.quit()
-    exit(1)
-except Exception as e:
-    print(f"Error loading participant data: {e}")
-    driver.quit()
-    exit(1)
 
 ################################################################################################################
 ## TASK MENU SELECTION
 ################################################################################################################
 
 
-def show_task_menu():
-    """Display the task menu and get user selection"""
+def show_task_menu(query=None):
+    """Display the task menu and get user selection, or look up the task matching query"""
     try:
-        if len(sys.argv) == 2:
+        if query is not None:
             print("Using program argument as task.")
-            return search_tasks(sys.argv[1])
+            return search_tasks(query)
     except:
-        print("Unable to find", sys.argv[1])
+        print("Unable to find", query)
 
     print("\n" + "=" * 70)
     print("ISLAND TASK MENU".center(70))
@@ -592,7 +544,7 @@ def show_task_menu():
         try:
             cat_choice = input("\nSelect a category (or 'q' to quit): ")
             if cat_choice.lower() == "q":
-                return None, None
+                return None, None, None
 
             cat_index = int(cat_choice) - 1
             if 0 <= cat_index < len(categories):
@@ -633,290 +585,365 @@ def show_task_menu():
     return category, selected_task, task_code
 
 
-print("Welcome to the Islands Task Runner")
-print(
-    "This script will run your selected task on participants from participants_ids.csv"
-)
-category, selected_task, task_code = show_task_menu()
+################################################################################################################
+## ASSIGN TASK
+################################################################################################################
 
-if not selected_task or not task_code:
-    print("Task selection cancelled. Exiting...")
-    driver.quit()
-    exit(0)
 
-# Confirm selection
-if len(sys.argv) == 1:
-    confirm = input(f"\nYou selected: {selected_task} ({task_code})\nProceed? (y/n): ")
-    if confirm.lower() != "y":
-        print("Task cancelled. Exiting...")
-        driver.quit()
-        exit(0)
+def click_and_confirm(driver, target, kind, capture=None, pipelined=False, timeout=TASK_TIMEOUT):
+    """Click target and return what the page did (see waits.watch_task), as a generator step
 
-print(f"\nPreparing to run task: {selected_task}, with code: {task_code}")
-time.sleep(1)
+    with pipelined the click and the wait for its reply are split by a yield, so a TabScheduler
+    can serve other tabs in between; otherwise it returns without yielding
+    """
+    if capture is not None:
+        return capture.click(target, kind, timeout)
+    if not pipelined:
+        return watch_task(driver, target, kind, timeout)
+    if not start_watch(driver, target, timeout):
+        return {"event": "missing", "text": "", "detail": ""}
+    yield
+    return finish_watch(driver, kind, timeout)
 
-################################################################################################################
-## MAIN LOOP
-################################################################################################################
 
-for df_count in range(0, SAMPLE_SIZE):
+def task_steps(driver, wait, row, tasks, visited=None, keep=None):
+    """Open one participant and start every task back to back in a single visit, as a job
+
+    the job yields whenever a click is waiting on the server when keep (the window handles of the
+    TabScheduler running it) is given, and otherwise runs straight through; see assign_tasks
+    """
+    started_at = {task_code: None for _, _, task_code in tasks}
+    pipelined = keep is not None
+
+    # Open the participant, directly by href when participant_ids.csv has one
+    if not open_islander(driver, wait, row, visited, keep or ()):
+        print("Could not reach participant, skipping")
+        driver.get(INDEX_URL)
+        page_ready(driver, "index")
+        return started_at
+
+    # Get the person's name
+    try:
+        name = wait.until(EC.presence_of_element_located((By.ID, "title"))).text
+        print(f"Selected person: {name}")
+    except:
+        name = "Unknown Person"
+
+    # Consent and task replies come straight off the network with ISLANDS_CAPTURE (one tab only)
+    capture = None if pipelined else capture_for(driver)
+
+    # Go to Tasks tab
     try:
-        print(f"\nAssigning task to participant {df_count+1}/{SAMPLE_SIZE}")
-
-        # Make sure we're on the index page
-        if "index.php" not in driver.current_url:
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
-
-        # Clean up windows if needed
-        if len(driver.window_handles) > 1:
-            original_window = driver.current_window_handle
-            for handle in driver.window_handles:
-                if handle != original_window:
-                    driver.switch_to.window(handle)
-                    driver.close()
-            driver.switch_to.window(driver.window_handles[0])
-
-        # Find cities and buttons
-        cities = wait.until(
-            EC.presence_of_all_elements_located(
-                (By.XPATH, '//a[starts-with(@href, "village")]')
-            )
-        )
-        buttons = []
-        for j in cities:
+        tab = wait.until(EC.element_to_be_clickable((By.ID, "t2tab")))
+        with span("tab switch", tab="t2tab"):
+            tab.click()
+            tab_ready(driver, 2)
+
+        # Check if we need consent
+        obtain_elements = driver.find_elements(By.ID, "obtain")
+        if len(obtain_elements) > 0:
             try:
-                button = j.find_element(
-                    By.XPATH, './/div[starts-with(@class, "town town")]'
+                obtain = wait.until(
+                    EC.element_to_be_clickable(
+                        (
+                            By.XPATH,
+                            '//a[starts-with(@href, "javascript:getConsent")]',
+                        )
+                    )
                 )
-                buttons.append(button)
-            except NoSuchElementException:
-                try:
-                    button = j.find_element(
-                        By.XPATH, './/div[starts-with(@class, "towndot towndot")]'
+                with span("consent"):
+                    outcome = yield from click_and_confirm(
+                        driver, obtain, "consent", capture, pipelined
                     )
-                    buttons.append(button)
-                except NoSuchElementException:
-                    continue
-
-        # Check if city index is valid
-        current_city_index = city_index[df_count]
-        if current_city_index < 0 or current_city_index >= len(buttons):
-            print(f"Invalid city index {current_city_index}, skipping")
-            tasks_failed += 1
-            continue
-
-        # Click the city
-        print(f"Clicking city {current_city_index}")
-        click_btn = ActionChains(driver)
-        click_btn.move_to_element(buttons[current_city_index])
-        click_btn.click()
-        click_btn.perform()
-        time.sleep(2)
-
-        # Find houses
-        houses = wait.until(
-            EC.presence_of_all_elements_located((By.CLASS_NAME, "house"))
-        )
-
-        # Check if house index is valid
-        current_sample_index = sample_index[df_count]
-        if current_sample_index < 0 or current_sample_index >= len(houses):
-            print(f"Invalid house index {current_sample_index}, skipping")
-            tasks_failed += 1
-            continue
-
-        # Click the house
-        print(f"Clicking house at index {current_sample_index}")
-        houses[current_sample_index].click()
-        time.sleep(2)
-
-        # Find residents
-        resident_links = wait.until(
-            EC.presence_of_all_elements_located(
-                (By.XPATH, '//a[starts-with(@href, "islander.php")]')
-            )
-        )
-
-        if len(resident_links) == 0:
-            print("Empty house, no residents found")
-            tasks_failed += 1
-            continue
-
-        # Check if person index is valid
-        current_person_index = person_index[df_count]
-        if current_person_index < 0 or current_person_index >= len(resident_links):
-            print(f"Invalid person index {current_person_index}, using 0 instead")
-            current_person_index = 0
-
-        # Click the person
-        resident_links[current_person_index].click()
-        time.sleep(2)
-
-        # Get the person's name
-        try:
-            name = wait.until(EC.presence_of_element_located((By.ID, "title"))).text
-            print(f"Selected person: {name}")
-        except:
-            name = "Unknown Person"
+                if not consented(outcome):
+                    print(f"Person declined consent")
+                    return started_at
+            except Exception as e:
+                print(f"Error getting consent: {e}")
+                return started_at
 
-        # Go to Tasks tab
+        # Run the tasks
         try:
-            tab = wait.until(EC.element_to_be_clickable((By.ID, "t2tab")))
-            tab.click()
-            time.sleep(1)
+            # Make sure task menu is displayed
+            task_menu_element = driver.find_element(By.ID, "task_menu")
+            if task_menu_element.get_attribute("style") == "display: none":
+                driver.execute_script(
+                    "document.getElementById('task_menu').style.display = 'block';"
+                )
 
-            # Check if we need consent
-            obtain_elements = driver.find_elements(By.ID, "obtain")
-            if len(obtain_elements) > 0:
-                try:
-                    obtain = wait.until(
-                        EC.element_to_be_clickable(
-                            (
-                                By.XPATH,
-                                '//a[starts-with(@href, "javascript:getConsent")]',
-                            )
-                        )
+            # For Blood Adrenaline, we need to open the "Blood Tests" submenu
+            toggle_submenu(driver, "blood")
+
+            # Start every task back to back, each confirmed as soon as the page shows it
+            clicked = []
+            detail = ""
+            for task in tasks:
+                category, selected_task, task_code = task
+                clicked_at = time.time()
+                with span("task start", task=task_code):
+                    outcome = yield from click_and_confirm(
+                        driver, task_selector(task_code), "task", capture, pipelined
                     )
-                    obtain.click()
-                    time.sleep(2)
-
-                    # Check if consent was given
-                    task_result = driver.find_elements(By.CLASS_NAME, "taskresulttask")
-                    if not task_result or "consented" not in task_result[-1].text:
-                        print(f"Person declined consent")
-                        tasks_failed += 1
-                        continue
-                except Exception as e:
-                    print(f"Error getting consent: {e}")
-                    tasks_failed += 1
+                if outcome["event"] == "missing":
+                    print(f"{selected_task} not found for this person")
                     continue
+                clicked.append(task)
+                detail = outcome["detail"] or detail
+                if task_started(task, outcome):
+                    print(f"Started {selected_task}")
+                    started_at[task_code] = clicked_at
+
+            if clicked:
+                started = [code for code, at in started_at.items() if at is not None]
+                if len(started) == len(clicked):
+                    print(f"✅ {len(started)} tasks successfully started for {name}!")
+                else:
+                    missing = [code for _, _, code in clicked if code not in started]
+                    print(f"⚠️ Could not verify tasks started: {', '.join(missing)}")
+                if detail:
+                    print(f"Task details: {detail}")
+
+        except Exception as e:
+            print(f"Error running tasks: {e}")
+    except Exception as e:
+        print(f"Error with tasks tab: {e}")
+
+    return started_at
+
+
+def assign_tasks(driver, wait, row, tasks, visited=None):
+    """Open one participant and start every task back to back in a single visit
+
+    tasks is a list of (category, task name, code). Returns {code: time.time() the task was
+    started, or None if it didn't}, so follow-ups can be timed from each participant's own start.
+    visited carries the village and house pages from one participant to the next (see open_islander)
+    """
+    return run_steps(task_steps(driver, wait, row, tasks, visited))
+
+
+def assign_task(driver, wait, row, selected_task, task_code):
+    """Start a single task, returning the time it started or None"""
+    return assign_tasks(driver, wait, row, [(None, selected_task, task_code)])[task_code]
 
-            # Run the task
-            try:
-                # Make sure task menu is displayed
-                task_menu_element = driver.find_element(By.ID, "task_menu")
-                if task_menu_element.get_attribute("style") == "display: none":
-                    driver.execute_script(
-                        "document.getElementById('task_menu').style.display = 'block';"
-                    )
-                    time.sleep(0.5)
 
-                # For Blood Adrenaline, we need to open the "Blood Tests" submenu
-                toggle_submenu(driver, "blood")
-                time.sleep(1)
+################################################################################################################
+## STAGE
+################################################################################################################
+
+
+def run_task(queries=None, driver=None, resume=False, tabs=1):
+    """Start one or more tasks for every participant in participant_ids.csv
 
-                # Look for the task span
-                task_span = None
+    queries is a task name or code, or a list of them (comma separated lists and bundle names
+    from TASK_BUNDLES work too); otherwise the menu is shown. All tasks are started in one visit
+    per participant, and each visit is journaled so resume skips the participants an interrupted
+    run of the same tasks already visited. A logged-in driver can be passed in to reuse it. With
+    tabs above 1, that many participants are worked on at once in tabs of the one Chrome.
+    Returns (tasks_completed, tasks_failed, driver), where driver is the one to keep using (a new
+    one if Chrome had to be restarted).
+    """
+    rows = load_rows()
+    SAMPLE_SIZE = len(rows)
+
+    print("Welcome to the Islands Task Runner")
+    print(
+        "This script will run your selected task on participants from participants_ids.csv"
+    )
+    if isinstance(queries, str):
+        queries = [queries]
+
+    if queries:
+        print("Using program arguments as tasks.")
+        tasks = resolve_tasks(queries)
+    else:
+        category, selected_task, task_code = show_task_menu()
+
+        if not selected_task or not task_code:
+            print("Task selection cancelled. Exiting...")
+            return 0, 0, driver
+
+        # Confirm selection
+        confirm = input(f"\nYou selected: {selected_task} ({task_code})\nProceed? (y/n): ")
+        if confirm.lower() != "y":
+            print("Task cancelled. Exiting...")
+            return 0, 0, driver
+
+        tasks = [(category, selected_task, task_code)]
+
+    task_names = ", ".join(f"{task_name} ({task_code})" for _, task_name, task_code in tasks)
+    print(f"\nPreparing to run tasks: {task_names}")
+    time.sleep(1)
+
+    # Set up counters, per task code
+    tasks_completed = {task_code: 0 for _, _, task_code in tasks}
+
+    # Participants an interrupted run of the same tasks already visited
+    task_codes = [task_code for _, _, task_code in tasks]
+    journal = Journal("do_task", resume)
+    done = set()
+    for entry in journal.entries:
+        if entry["tasks"] == task_codes:
+            done.add(entry["position"])
+            for task_code, at in entry["started"].items():
+                if at is not None:
+                    tasks_completed[task_code] += 1
+    if journal.finished and len(done) == SAMPLE_SIZE:
+        journal.close()
+        total_completed = sum(tasks_completed.values())
+        return total_completed, SAMPLE_SIZE * len(tasks) - total_completed, driver
+
+    session_id = read_session_id()
+    if driver is None:
+        driver = start_logged_in_driver(session_id)
+    wait = WebDriverWait(driver, 10)
+
+    store = ResultsStore()
+    store.add_participants(rows)
+
+    start_time = time.time()
+
+    ## MAIN LOOP
+
+    def record(row, started_at):
+        for task_code, at in started_at.items():
+            if at is not None:
+                tasks_completed[task_code] += 1
+                store.record_task_run(row, task_code, at)
+        journal.append({"position": row["position"], "tasks": task_codes, "started": started_at})
+        print(f"Total tasks: {sum(tasks_completed.values())}")
+
+    # City by city, so consecutive participants share their village and house pages
+    todo = [row for row in plan_visits(rows) if row["position"] not in done]
+
+    if tabs > 1:
+        # Several participants at once: while one tab waits on the server, the next one is opened
+        by_position = {row["position"]: row for row in todo}
+        handled = set()
+
+        def jobs(rows, scheduler):
+            for row in rows:
+                print(f"\nAssigning tasks to participant {row['position']+1}/{SAMPLE_SIZE} in a tab")
+                yield row["position"], task_steps(driver, wait, row, tasks, keep=scheduler.handles)
+
+        def finished(position, started_at):
+            handled.add(position)
+            # A participant whose job failed isn't journaled, so --resume tries them again
+            if started_at is None:
+                print(f"Could not assign tasks to participant {position+1}")
+                return
+            record(by_position[position], started_at)
+
+        stalled = 0
+        while True:
+            remaining = [row for row in todo if row["position"] not in handled]
+            if not remaining:
+                break
+            handled_before = len(handled)
+            try:
+                scheduler = TabScheduler(driver, tabs)
+                scheduler.run(jobs(remaining, scheduler), finished)
+            except WebDriverException as e:
+                # Chrome died under the tabs: start a new one for the participants not finished yet
+                stalled = 0 if len(handled) > handled_before else stalled + 1
+                if stalled >= 3:
+                    print(f"Chrome keeps failing ({e}), stopping: rerun with --resume for the rest")
+                    break
+                print(f"Chrome stopped responding ({e}), refreshing session")
                 try:
-                    task_spans = driver.find_elements(
-                        By.XPATH,
-                        f"//span[contains(@onclick, \"startTask('{task_code}')\")]",
-                    )
-                    if task_spans:
-                        task_span = task_spans[0]
-                except:
+                    driver.quit()
+                except Exception:
                     pass
+                driver = start_logged_in_driver(session_id)
+                wait = WebDriverWait(driver, 10)
+    else:
+        visited = {}
+        for row in todo:
+            df_count = row["position"]
+            try:
+                print(f"\nAssigning tasks to participant {df_count+1}/{SAMPLE_SIZE}")
 
-                # Click the task if found using JavaScript
-                if task_span:
-                    print(f"Found {selected_task}, clicking...")
-                    # Use JavaScript to click instead of direct click
-                    if click_with_javascript(driver, task_span):
-                        print("Used JavaScript click")
-                    else:
-                        print("JavaScript click failed, trying regular click")
-                        task_span.click()
-                    time.sleep(2)
-
-                    # Check for the specific detail box that shows the task has started
-                    try:
-                        # Verify that the task started correctly
-                        success, detail_text = verify_task_started(driver)
-
-                        if success:
-                            tasks_completed += 1
-                            print(
-                                f"✅ Task successfully started for {name}! Total tasks: {tasks_completed}"
-                            )
-                            print(f"Task details: {detail_text}")
-
-                            # Optional: Wait for a moment to see the progress
-                            time.sleep(2)
-                        else:
-                            print(f"⚠️ Could not verify task started: {detail_text}")
-                            tasks_failed += 1
-                    except Exception as e:
-                        print(f"Could not verify task started: {e}")
-                        # Check for any task result as a backup method
-                        task_results = driver.find_elements(
-                            By.CLASS_NAME, "taskresulttask"
-                        )
-                        if task_results and task_code in task_results[-1].text.lower():
-                            tasks_completed += 1
-                            print(f"Task appears to have started based on task results")
-                        else:
-                            tasks_failed += 1
-                            print("Could not confirm if task started successfully")
-                else:
-                    print(f"{selected_task} not found for this person")
-                    tasks_failed += 1
+                with span("participant", position=df_count):
+                    started_at = assign_tasks(driver, wait, row, tasks, visited)
+                record(row, started_at)
 
             except Exception as e:
-                print(f"Error running task: {e}")
-                tasks_failed += 1
-        except Exception as e:
-            print(f"Error with tasks tab: {e}")
-            tasks_failed += 1
+                print(f"Unexpected error processing participant {df_count+1}: {e}")
 
-        # Return to index page for next iteration
-        try:
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
-        except Exception as e:
-            print(f"Error returning to index: {e}")
+                # Try to recover
+                try:
+                    driver.get(INDEX_URL)
+                    page_ready(driver, "index")
+                except:
+                    print("Could not recover, refreshing session")
+                    driver.quit()
+                    driver = start_logged_in_driver(session_id)
+                    wait = WebDriverWait(driver, 10)
 
-    except Exception as e:
-        print(f"Unexpected error processing participant {df_count+1}: {e}")
-        tasks_failed += 1
+    # Final report
+    end_time = time.time()
+    execution_time = end_time - start_time
 
-        # Try to recover
-        try:
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
-        except:
-            print("Could not recover, refreshing session")
-            driver.quit()
-            driver = webdriver.Chrome(options=chrome_options)
-
-            # Re-login
-            driver.get("https://islands.smp.uq.edu.au/login.php")
-            time.sleep(1)
-            driver.delete_all_cookies()
-            driver.add_cookie(
-                {
-                    "name": "PHPSESSID",
-                    "value": session_id,
-                    "path": "/",
-                    "domain": "islands.smp.uq.edu.au",
-                }
-            )
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
-
-# Final report
-end_time = time.time()
-execution_time = end_time - start_time
-
-print("\n" + "=" * 70)
-print(f"TASK EXECUTION SUMMARY: {selected_task}".center(70))
-print("=" * 70)
-print(f"Total tasks attempted: {SAMPLE_SIZE}")
-print(f"Successfully completed tasks: {tasks_completed}")
-print(f"Failed tasks: {tasks_failed}")
-print(f"Success rate: {tasks_completed/SAMPLE_SIZE*100:.1f}%")
-print(f"Script runtime: {str(datetime.timedelta(seconds=execution_time))}")
-print("=" * 70)
-
-time.sleep(5)
-driver.close()
+    total_completed = sum(tasks_completed.values())
+    total_attempted = SAMPLE_SIZE * len(tasks)
+    tasks_failed = total_attempted - total_completed
+
+    print("\n" + "=" * 70)
+    print(f"TASK EXECUTION SUMMARY: {task_names}".center(70))
+    print("=" * 70)
+    for _, task_name, task_code in tasks:
+        print(f"{task_name}: {tasks_completed[task_code]}/{SAMPLE_SIZE} started")
+    print(f"Total tasks attempted: {total_attempted}")
+    print(f"Successfully completed tasks: {total_completed}")
+    print(f"Failed tasks: {tasks_failed}")
+    print(f"Success rate: {total_completed/total_attempted*100:.1f}%")
+    print(f"Script runtime: {str(datetime.timedelta(seconds=execution_time))}")
+    print("=" * 70)
+
+    store.close()
+    journal.finish()
+    return total_completed, tasks_failed, driver
+
+
+################################################################################################################
+## RUN
+################################################################################################################
+
+parser = argparse.ArgumentParser(description="Start tasks for every participant")
+parser.add_argument(
+    "tasks",
+    nargs="*",
+    help="task names or codes, comma separated lists work too (shows the menu if none are given)",
+)
+parser.add_argument(
+    "--bundle",
+    action="append",
+    default=[],
+    choices=sorted(TASK_BUNDLES),
+    help="start every task of a bundle (can be given more than once)",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="skip the participants an interrupted run of the same tasks already visited",
+)
+parser.add_argument(
+    "--tabs",
+    type=int,
+    default=1,
+    help="participants to work on at once, each in its own tab of one Chrome (default: 1)",
+)
+
+
+def main():
+    args = parser.parse_args()
+    tasks_completed, tasks_failed, driver = run_task(
+        args.tasks + args.bundle, resume=args.resume, tabs=args.tabs
+    )
+
+    if driver is not None:
+        time.sleep(5)
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+one-call page extraction for Chrome
+
+reading `.text` off every element found with find_elements is a WebDriver round
+trip per element. These functions run one execute_script per page instead and
+get back everything a stage needs from it as one JSON object, in the same shape
+the HTTP backend's parsers return (see http_backend.py), so both backends read
+the same fields.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from http_backend import crumb_name
+
+################################################################################################################
+## SCRIPTS
+################################################################################################################
+
+# Shared by every script: whitespace-normalised text and raw hrefs. Like Selenium's .text, an
+# element that isn't displayed (e.g. on a tab that isn't shown) reads as ''
+HELPERS = r"""
+function text(el) {
+    if (!el || !el.getClientRects().length || window.getComputedStyle(el).visibility === 'hidden') {
+        return '';
+    }
+    return el.innerText.replace(/\s+/g, ' ').trim();
+}
+function texts(selector) {
+    return Array.prototype.map.call(document.querySelectorAll(selector), text);
+}
+function hrefOf(el) {
+    var anchor = el.closest('a[href]') || el.querySelector('a[href]');
+    if (anchor) { return anchor.getAttribute('href'); }
+    var match = /location[^'"]*['"]([^'"]+)['"]/.exec(el.getAttribute('onclick') || '');
+    return match ? match[1] : null;
+}
+"""
+
+INDEX_SCRIPT = (
+    HELPERS
+    + r"""
+var anchors = document.querySelectorAll('a[href^="village"]');
+return {
+    village_hrefs: Array.prototype.filter.call(anchors, function (a) {
+        return a.querySelector('div[class^="town town"], div[class^="towndot towndot"]');
+    }).map(function (a) { return a.getAttribute('href'); })
+};
+"""
+)
+
+VILLAGE_SCRIPT = (
+    HELPERS
+    + r"""
+return {
+    title: text(document.getElementById('title')),
+    house_ids: texts('.houseid'),
+    house_hrefs: Array.prototype.map.call(document.querySelectorAll('.house'), hrefOf)
+};
+"""
+)
+
+ISLANDER_SCRIPT = (
+    HELPERS
+    + r"""
+return {
+    title: text(document.getElementById('title')),
+    crumb: text(document.querySelector('.crumb')),
+    stats: texts('tr'),
+    task_results: texts('.taskresulttask'),
+    results: texts('.taskresultresult'),
+    chat: texts('.chatbot')
+};
+"""
+)
+
+################################################################################################################
+## EXTRACTION
+################################################################################################################
+
+
+def extract_index(driver):
+    """Village hrefs for every city that has a town button, in page order"""
+    return driver.execute_script(INDEX_SCRIPT)["village_hrefs"]
+
+
+def extract_village(driver):
+    """Title, house ids and house hrefs of the village page Chrome is on"""
+    return driver.execute_script(VILLAGE_SCRIPT)
+
+
+def extract_islander(driver):
+    """Title, name, stats rows, task results and chat replies of the islander page Chrome is on"""
+    islander = driver.execute_script(ISLANDER_SCRIPT)
+    islander["name"] = crumb_name(islander.pop("crumb"))
+    return islander
@@ -5,25 +5,30 @@
 ## IMPORTS
 ################################################################################################################
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    TimeoutException,
-    NoSuchElementException,
-    StaleElementReferenceException,
-)
+from selenium.common.exceptions import StaleElementReferenceException
 
 import numpy as np
 import pandas as pd
 import time
 import datetime
 import sys
-import pickle
+import argparse
+
+from session import INDEX_URL, read_session_id, start_logged_in_driver
+from http_backend import HttpBackend, parse_stats
+from navigation import relative_href, absolute_url, city_on_map, click_city
+from census import load_census
+from cache_store import load_house_cache, CacheFormatError
+from collect_participant_info import INFO_COLUMNS, ask_gender, empty_record
+from journal import Journal
+from tracing import span
+from extract import extract_index, extract_islander
+from results_store import ResultsStore
+from waits import page_ready, tab_ready, watch_task
+from capture import capture_for, consented
 
 
 ################################################################################################################
@@ -31,486 +36,754 @@ import pickle
 ################################################################################################################
 
 
-try:
-    if len(sys.argv) == 4:
-        SAMPLE_SIZE = int(sys.argv[1])
-        MINIMUM_AGE = int(sys.argv[2])
-        MAXIMUM_AGE = int(sys.argv[3])
-    else:
-        print(
-            "\nYou will now be asked to enter the number of, the minimum age and the maximum age of your participants."
-        )
-        SAMPLE_SIZE = int(
-            input("\nPlease enter the number of participants you want to find: ")
-        )
-        MINIMUM_AGE = int(input("Please enter the minimum age for your participants: "))
-        MAXIMUM_AGE = int(input("Please enter the maximum age of your participants: "))
+parser = argparse.ArgumentParser(description="Find and consent participants")
+parser.add_argument("sample_size", nargs="?", type=int)
+parser.add_argument("minimum_age", nargs="?", type=int)
+parser.add_argument("maximum_age", nargs="?", type=int)
+parser.add_argument(
+    "--http",
+    action="store_true",
+    help="check candidates over HTTP and only use Chrome for the consent step",
+)
+parser.add_argument(
+    "--with-info",
+    action="store_true",
+    help="also write participant_info.csv while consenting, so collect_participant_info.py isn't needed",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="carry on from the journal of an interrupted run instead of starting again",
+)
+parser.add_argument(
+    "--no-census",
+    action="store_true",
+    help="ignore the census/ dataset even if cache.py --census has built one",
+)
 
-    if SAMPLE_SIZE != 0 and MINIMUM_AGE >= 0 and MAXIMUM_AGE >= MINIMUM_AGE:
-        print(
-            "Ok, Chrome will now open and participants will be found to match your criteria."
-        )
-    else:
+
+def read_criteria(args):
+    """Sample size and age range from the command line, or asked for interactively"""
+    try:
+        if args.maximum_age is not None:
+            sample_size = args.sample_size
+            minimum_age = args.minimum_age
+            maximum_age = args.maximum_age
+        else:
+            print(
+                "\nYou will now be asked to enter the number of, the minimum age and the maximum age of your participants."
+            )
+            sample_size = int(
+                input("\nPlease enter the number of participants you want to find: ")
+            )
+            minimum_age = int(input("Please enter the minimum age for your participants: "))
+            maximum_age = int(input("Please enter the maximum age of your participants: "))
+
+        if sample_size != 0 and minimum_age >= 0 and maximum_age >= minimum_age:
+            print(
+                "Ok, Chrome will now open and participants will be found to match your criteria."
+            )
+        else:
+            print("Invalid input received. Exiting.")
+            sys.exit()
+
+    except:
         print("Invalid input received. Exiting.")
         sys.exit()
 
-except:
-    print("Invalid input received. Exiting.")
-    sys.exit()
-
-################################################################################################################
+    return sample_size, minimum_age, maximum_age
 
-start_time = time.time()
 
 ################################################################################################################
-## LOGIN
+## HELPERS
 ################################################################################################################
 
-chrome_options = Options()
-chrome_options.add_experimental_option("detach", True)
-chrome_options.add_argument("--start-maximized")  # Still useful for viewport size
-chrome_options.add_argument("--headless=new")  # This runs Chrome in background
-chrome_options.add_argument("--disable-gpu")  # Recommended for headless
-chrome_options.add_argument("--window-size=1920,1080")  # Set viewport explicitly
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-
-# Initialize the driver
-driver = webdriver.Chrome(options=chrome_options)
-
-# Read session cookie from file
-try:
-    with open("session_cookie", "r") as cookie_file:
-        session_id = cookie_file.read().strip()
-        print(f"Read session ID from file: {session_id}")
-except FileNotFoundError:
-    print(
-        "Error: session_cookie file not found. Please create this file with your session ID."
-    )
-    driver.quit()
-    exit(1)
-except Exception as e:
-    print(f"Error reading session_cookie file: {e}")
-    driver.quit()
-    exit(1)
-
-# Check if session ID is empty
-if not session_id:
-    print(
-        "Error: session_cookie file is empty. Please add your session ID to this file."
-    )
-    driver.quit()
-    exit(1)
-
-# Navigate to the login page
-driver.get("https://islands.smp.uq.edu.au/login.php")
-
-# Wait for page to load
-driver.implicitly_wait(1)
-
-# Get the current PHPSESSID cookie (if it exists)
-phpsessid_cookie = driver.get_cookie("PHPSESSID")
-print(phpsessid_cookie)
-
-# If the cookie doesn't exist yet, create a new one
-if not phpsessid_cookie:
-    print("PHPSESSID cookie not found, creating new one")
-    # Use session ID from file
-    driver.add_cookie(
-        {
-            "name": "PHPSESSID",
-            "value": session_id,
-            "path": "/",
-            "domain": "islands.smp.uq.edu.au",
-        }
-    )
-else:
-    # Modify the existing cookie
-    print(f"Found existing PHPSESSID: {phpsessid_cookie['value']}")
-    # Replace with session ID from file
-    driver.delete_cookie("PHPSESSID")
-    driver.add_cookie(
-        {
-            "name": "PHPSESSID",
-            "value": session_id,
-            "path": "/",
-            "domain": "islands.smp.uq.edu.au",
-        }
-    )
-
-# Verify the cookie was set
-updated_cookie = driver.get_cookie("PHPSESSID")
-print(f"Updated PHPSESSID: {updated_cookie['value']}")
 
-# Refresh the page to apply the cookie
-driver.get("https://islands.smp.uq.edu.au/index.php")
-driver.implicitly_wait(3)
+def load_cache(num_cities, village_hrefs=None):
+    """Load the house index cache, exiting if it is missing
 
-# Check if login was successful
-if "login.php" in driver.current_url:
-    print("Login failed - still on login page. Check if your session ID is valid.")
-    driver.quit()
-    exit(1)
-else:
-    print("Successfully logged in!")
-
-################################################################################################################
-## ENUMERATE CONSTANTS AND GLOBAL VARS
-################################################################################################################
+    returns the cache and the indices of the cities it still describes. When the map has
+    changed only those cities are sampled (village hrefs are compared when they are given)
+    and `cache.py --refresh` brings the cache up to date.
+    """
+    try:
+        cache = load_house_cache()
+    except CacheFormatError as e:
+        print(f"Error loading cache: {e}")
+        exit(1)
+    print(f"Loaded cache with {len(cache)} cities")
 
+    cities = list(range(min(num_cities, len(cache))))
+    if village_hrefs is not None and cache.village_hrefs is not None:
+        if not cache.matches(village_hrefs):
+            cities = [
+                city for city in cities if cache.village_hrefs[city] == village_hrefs[city]
+            ]
+    if len(cities) < num_cities or len(cache) != num_cities:
+        print(
+            f"Warning: the map has changed since the cache was built, sampling from {len(cities)} "
+            f"of {num_cities} cities. Run `python3 cache.py --refresh` to update it."
+        )
+    if not cities:
+        print("Error loading cache: no city in the cache matches the map")
+        exit(1)
+    return cache, cities
+
+
+def pick_house(cache, rng_city):
+    """Choose a random occupied house in a city, returning its index or None after too many misses"""
+    # Find the number of houses
+    NUM_HOUSES = cache.max_house(rng_city)
+
+    ## choose a random house
+    # check that the house is valid with people
+    max_attempts = 5  # Prevent infinite loops
+    attempts = 0
+    while attempts < max_attempts:
+        rng_house = np.random.randint(1, high=NUM_HOUSES)
+        SAMPLE_INDEX = cache.sample_index(rng_city, rng_house)
+        if SAMPLE_INDEX is not None:
+            print("Participant house " + str(rng_house))
+            return SAMPLE_INDEX
+        else:
+            print("Invalid House. Searching again.")
+            attempts += 1
 
-people_sampled = 0
+    return None
 
-# Use WebDriverWait to ensure elements are loaded
-wait = WebDriverWait(driver, 10)
-cities = wait.until(
-    EC.presence_of_all_elements_located(
-        (By.XPATH, '//a[starts-with(@href, "village")]')
-    )
-)
-NUM_CITIES = len(cities)
 
-buttons = []
-for j in cities:
+def obtain_consent(driver, wait):
+    """Open the Tasks tab of the current islander and ask for consent, returning True if they consented"""
+    # Click the "Tasks" tab
     try:
-        # Try both class name patterns to handle potential differences
-        button = j.find_element(By.XPATH, './/div[starts-with(@class, "town town")]')
-        buttons.append(button)
-    except NoSuchElementException:
+        tab = wait.until(EC.element_to_be_clickable((By.ID, "t2tab")))
+        with span("tab switch", tab="t2tab"):
+            tab.click()
+            tab_ready(driver, 2)
+
+        # Try to get consent
         try:
-            button = j.find_element(
-                By.XPATH, './/div[starts-with(@class, "towndot towndot")]'
-            )
-            buttons.append(button)
-        except NoSuchElementException:
-            print(f"Warning: Could not find button for city {j.get_attribute('href')}")
+            obtain_elements = driver.find_elements(By.ID, "obtain")
 
-print(f"Found {len(buttons)} city buttons out of {NUM_CITIES} cities")
-assert len(buttons) > 0  # Still need some buttons!
+            if len(obtain_elements) > 0:
+                try:
+                    obtain = wait.until(
+                        EC.element_to_be_clickable(
+                            (
+                                By.XPATH,
+                                '//a[starts-with(@href, "javascript:getConsent")]',
+                            )
+                        )
+                    )
+                    capture = capture_for(driver)
+                    with span("consent"):
+                        if capture is not None:
+                            # The consent reply, straight off the network
+                            outcome = capture.click(obtain, "consent")
+                        else:
+                            # Click and wait for the reply row in one round trip
+                            outcome = watch_task(driver, obtain, "consent")
+                    if consented(outcome):
+                        print("consented")
+                        return True
+                    else:
+                        print("Person declined. sample again")
+                except Exception as e:
+                    print(f"Error getting consent: {e}")
+            else:
+                print("No obtain element found")
+        except Exception as e:
+            print(f"Error with consent section: {e}")
+    except Exception as e:
+        print(f"Error with tasks tab: {e}")
+    return False
+
+
+def info_record(name, stats):
+    """A participant_info.csv record from the details read while sampling (gender is asked later)"""
+    record = empty_record()
+    record["name"] = name
+    record.update(stats)
+    return record
+
+
+def add_participant(
+    found,
+    journal,
+    city_index,
+    sample_index,
+    person_index,
+    village_href,
+    islander_href,
+    info=None,
+):
+    """Record a consented participant, journaling them straight away so a crash can't lose them"""
+    participant = {
+        "city_index": int(city_index),
+        "sample_index": int(sample_index),
+        "person_index": int(person_index),
+        "village_href": village_href,
+        "islander_href": islander_href,
+        "info": info,
+    }
+    found.append(participant)
+    if journal is not None:
+        journal.append(participant)
 
-city = []  # rng_city
-housers = []  # SAMPLE_INDEX
-persons = []  # rng_person
 
 ################################################################################################################
-## LOAD CACHE
+## CENSUS SAMPLING
 ################################################################################################################
 
-try:
-    cache_file = open(r"cache", "rb")
-    cache = pickle.load(cache_file)
-    cache_file.close()
-    # cache check assertion
-    print(f"Loaded cache with {len(cache)} cities")
-    assert len(cache) == NUM_CITIES
-except (FileNotFoundError, AssertionError) as e:
-    print(f"Error loading cache: {e}")
-    exit(1)
+
+def sample_with_census(
+    columns,
+    sample_size,
+    minimum_age,
+    maximum_age,
+    found,
+    journal=None,
+    with_info=False,
+    driver=None,
+):
+    """Draw eligible islanders straight from the census and only use Chrome for consent
+
+    consenting participants are added to found (and the journal); with_info also records
+    their participant_info.csv details
+    """
+    if driver is None:
+        driver = start_logged_in_driver()
+    wait = WebDriverWait(driver, 10)
+    rng = np.random.default_rng()
+
+    # Participants found so far (more than none when resuming)
+    people_sampled = len(found)
+
+    # Everyone of the right age who has not been asked yet
+    age = np.asarray(columns["age"])
+    eligible = (age >= minimum_age) & (age <= maximum_age)
+    if found:
+        asked = {participant["islander_href"] for participant in found}
+        eligible &= ~np.isin(columns["islander_href"], list(asked))
+    print(f"{int(eligible.sum())} of {len(age)} islanders in the census are eligible")
+
+    while people_sampled < sample_size and eligible.any():
+        # Draw as many candidates as we still need, without replacement, in one go
+        remaining = np.flatnonzero(eligible)
+        needed = min(sample_size - people_sampled, len(remaining))
+        candidates = rng.choice(remaining, size=needed, replace=False)
+        eligible[candidates] = False
+
+        for i in candidates:
+            try:
+                islander_href = str(columns["islander_href"][i])
+                print(f"touched {columns['name'][i]} (age {columns['age'][i]})")
+
+                driver.get(absolute_url(islander_href))
+                if obtain_consent(driver, wait):
+                    info = None
+                    if with_info:
+                        stats = {
+                            column: columns[column][i].item()
+                            for column in (
+                                "age",
+                                "island",
+                                "house_num",
+                                "education_level",
+                                "income",
+                            )
+                        }
+                        info = info_record(str(columns["name"][i]), stats)
+                        info["gender"] = ask_gender(driver, wait)
+                    people_sampled += 1
+                    add_participant(
+                        found,
+                        journal,
+                        columns["city_index"][i],
+                        columns["sample_index"][i],
+                        columns["person_index"][i],
+                        str(columns["village_href"][i]),
+                        islander_href,
+                        info,
+                    )
+                    print(f"Found {people_sampled} of {sample_size} participants")
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+
+    if people_sampled < sample_size:
+        print("Ran out of eligible islanders in the census")
+
+    return driver
+
 
 ################################################################################################################
-## RUNTIME BODY
+## HTTP SAMPLING
 ################################################################################################################
 
-while people_sampled < SAMPLE_SIZE:
-    try:
-        # generate a random city
-        rng_city = np.random.randint(0, high=NUM_CITIES - 1)
-
-        ## window check 1
-        # Store the ID of the original window
-        original_window = driver.current_window_handle
-
-        # Loop through until we find a new window handle
-        if (
-            driver.current_window_handle == original_window
-            and len(driver.window_handles) > 1
-        ):
-            driver.close()
-
-        driver.switch_to.window(driver.window_handles[0])
-
-        # Check we don't have other windows open already
-        assert len(driver.window_handles) == 1
-
-        # Ensure we're on the index page before trying to find cities
-        if "index.php" not in driver.current_url:
-            print("Not on index page, navigating back")
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
-
-        # Re-fetch cities and buttons as they might be stale
-        wait = WebDriverWait(driver, 10)
-        cities = wait.until(
-            EC.presence_of_all_elements_located(
-                (By.XPATH, '//a[starts-with(@href, "village")]')
-            )
-        )
-        buttons = []
 
-        # Try both possible button class patterns
-        for j in cities:
+def sample_with_http(
+    sample_size,
+    minimum_age,
+    maximum_age,
+    found,
+    journal=None,
+    with_info=False,
+    driver=None,
+):
+    """Check candidates' ages over HTTP and only open eligible ones in Chrome for consent
+
+    consenting participants are added to found (and the journal); with_info also records
+    their participant_info.csv details
+    """
+    session_id = read_session_id()
+    if driver is None:
+        driver = start_logged_in_driver(session_id)
+    wait = WebDriverWait(driver, 10)
+
+    # Participants found so far (more than none when resuming)
+    people_sampled = len(found)
+
+    with HttpBackend(session_id) as backend:
+        backend.login()
+        NUM_CITIES = len(backend.village_hrefs())
+        cache, cached_cities = load_cache(NUM_CITIES, backend.village_hrefs())
+
+        while people_sampled < sample_size:
             try:
-                button = j.find_element(
-                    By.XPATH, './/div[starts-with(@class, "town town")]'
-                )
-                buttons.append(button)
-            except NoSuchElementException:
-                try:
-                    button = j.find_element(
-                        By.XPATH, './/div[starts-with(@class, "towndot towndot")]'
-                    )
-                    buttons.append(button)
-                except NoSuchElementException:
+                # generate a random city
+                rng_city = cached_cities[
+                    np.random.randint(0, high=max(len(cached_cities) - 1, 1))
+                ]
+
+                SAMPLE_INDEX = pick_house(cache, rng_city)
+                if SAMPLE_INDEX is None:
+                    print("Too many invalid house attempts, trying a different city")
                     continue
 
-        # Click on the random city button
-        if rng_city < len(buttons):
-            print(f"Clicking on city {rng_city}")
-            click_btn = ActionChains(driver)
-            click_btn.move_to_element(buttons[rng_city])
-            click_btn.click()
-            click_btn.perform()
-            time.sleep(2)  # Give time for page to load
-        else:
-            print(
-                f"City index {rng_city} is out of range for buttons array (len={len(buttons)})"
-            )
-            continue
+                residents = backend.residents(backend.village(rng_city), SAMPLE_INDEX)
+                num_residents = len(residents)
+                if num_residents == 0:
+                    print("empty house")
+                    continue
+                elif num_residents == 1:
+                    rng_person = 0
+                else:
+                    rng_person = np.random.randint(low=0, high=num_residents - 1)
 
-        ## window check 2
-        # Store the ID of the original window
-        original_window = driver.current_window_handle
+                islander = backend.islander(residents[rng_person])
+                print("touched " + islander["title"])
 
-        # Loop through until we find a new window handle
-        if (
-            driver.current_window_handle == original_window
-            and len(driver.window_handles) > 1
-        ):
-            driver.close()
+                # Check if their age is in the right age range
+                if len(islander["stats"]) <= 1:
+                    print("Summary table not found")
+                    continue
+                age_text = islander["stats"][1].split()
+                if len(age_text) == 0:
+                    print("Could not parse age")
+                    continue
+                age = int(age_text[0])
+                if age < minimum_age or age > maximum_age:
+                    print(f"Incorrect age ({age}). sample again")
+                    continue
 
-        driver.switch_to.window(driver.window_handles[0])
+                # Consent needs JavaScript, so only now open the islander in Chrome
+                driver.get(backend.url(residents[rng_person]))
+                if obtain_consent(driver, wait):
+                    info = None
+                    if with_info:
+                        info = info_record(islander["name"], parse_stats(islander["stats"]))
+                        info["gender"] = ask_gender(driver, wait)
+                    people_sampled += 1
+                    add_participant(
+                        found,
+                        journal,
+                        rng_city,
+                        SAMPLE_INDEX,
+                        rng_person,
+                        backend.village_hrefs()[rng_city],
+                        residents[rng_person],
+                        info,
+                    )
+                    print(f"Found {people_sampled} of {sample_size} participants")
 
-        # Check we don't have other windows open already
-        assert len(driver.window_handles) == 1
+            except Exception as e:
+                print(f"Unexpected error: {e}")
 
-        # Get houses with proper wait
-        try:
-            houses = wait.until(
-                EC.presence_of_all_elements_located((By.CLASS_NAME, "house"))
-            )
-            ids = driver.find_elements(By.CLASS_NAME, "houseid")
-
-            # Find the number of houses
-            NUM_HOUSES = int(list(cache[rng_city].keys())[-1])
-            setids = set(cache[rng_city].keys())
-
-            ## choose a random house
-            # check that the house is valid with people
-            max_attempts = 5  # Prevent infinite loops
-            attempts = 0
-            while attempts < max_attempts:
-                rng_house = np.random.randint(1, high=NUM_HOUSES)
-                if str(rng_house) in setids:
-                    print("Participant house " + str(rng_house))
-                    break
-                else:
-                    print("Invalid House. Searching again.")
-                    attempts += 1
+    return driver
 
-            if attempts >= max_attempts:
-                print("Too many invalid house attempts, trying a different city")
-                driver.get("https://islands.smp.uq.edu.au/index.php")
-                time.sleep(2)
-                continue
 
-            SAMPLE_INDEX = cache[rng_city][str(rng_house)]
+################################################################################################################
+## SELENIUM SAMPLING
+################################################################################################################
+
 
-            # Click the house with proper error handling
-            try:
-                if SAMPLE_INDEX < len(houses):
-                    houses[SAMPLE_INDEX].click()
-                    time.sleep(1)
-                else:
-                    print(
-                        f"House index {SAMPLE_INDEX} out of range (max={len(houses)-1})"
-                    )
-                    driver.get("https://islands.smp.uq.edu.au/index.php")
-                    time.sleep(2)
-                    continue
-            except (StaleElementReferenceException, IndexError) as e:
-                print(f"Error clicking house: {e}")
-                driver.get("https://islands.smp.uq.edu.au/index.php")
-                time.sleep(2)
+def sample_with_selenium(
+    sample_size,
+    minimum_age,
+    maximum_age,
+    found,
+    journal=None,
+    with_info=False,
+    driver=None,
+):
+    """Click through random cities, houses and residents in Chrome until enough consent
+
+    consenting participants are added to found (and the journal); with_info also records
+    their participant_info.csv details
+    """
+
+    ## LOGIN
+
+    session_id = read_session_id()
+    if driver is None:
+        driver = start_logged_in_driver(session_id)
+    else:
+        driver.get(INDEX_URL)
+
+    ## ENUMERATE CONSTANTS AND GLOBAL VARS
+
+
+    # Use WebDriverWait to ensure elements are loaded
+    wait = WebDriverWait(driver, 10)
+    NUM_CITIES, _, _ = wait.until(city_on_map(0))
+
+    print(f"Found {NUM_CITIES} city buttons")
+    assert NUM_CITIES > 0  # Still need some buttons!
+
+    # Participants found so far (more than none when resuming)
+    people_sampled = len(found)
+
+    cache, cached_cities = load_cache(NUM_CITIES, extract_index(driver))
+
+    ## RUNTIME BODY
+
+    while people_sampled < sample_size:
+        try:
+            # generate a random city
+            rng_city = cached_cities[
+                np.random.randint(0, high=max(len(cached_cities) - 1, 1))
+            ]
+
+            ## window check 1
+            # Store the ID of the original window
+            original_window = driver.current_window_handle
+
+            # Loop through until we find a new window handle
+            if (
+                driver.current_window_handle == original_window
+                and len(driver.window_handles) > 1
+            ):
+                driver.close()
+
+            driver.switch_to.window(driver.window_handles[0])
+
+            # Check we don't have other windows open already
+            assert len(driver.window_handles) == 1
+
+            # Ensure we're on the index page before trying to find cities
+            if "index.php" not in driver.current_url:
+                print("Not on index page, navigating back")
+                driver.get(INDEX_URL)
+
+            # Click on the random city button, looked up in one query
+            wait = WebDriverWait(driver, 10)
+            print(f"Clicking on city {rng_city}")
+            if not click_city(driver, wait, int(rng_city)):
                 continue
+            village_href = relative_href(driver.current_url)
+
+            ## window check 2
+            # Store the ID of the original window
+            original_window = driver.current_window_handle
 
-            # Find residents with proper waiting
+            # Loop through until we find a new window handle
+            if (
+                driver.current_window_handle == original_window
+                and len(driver.window_handles) > 1
+            ):
+                driver.close()
+
+            driver.switch_to.window(driver.window_handles[0])
+
+            # Check we don't have other windows open already
+            assert len(driver.window_handles) == 1
+
+            # Get houses with proper wait
             try:
-                resident_links = wait.until(
-                    EC.presence_of_all_elements_located(
-                        (By.XPATH, '//a[starts-with(@href, "islander.php")]')
-                    )
+                houses = wait.until(
+                    EC.presence_of_all_elements_located((By.CLASS_NAME, "house"))
                 )
-                num_residents = len(resident_links)
 
-                if num_residents == 0:
-                    print("empty house")
-                    driver.get("https://islands.smp.uq.edu.au/index.php")
-                    time.sleep(2)
+                SAMPLE_INDEX = pick_house(cache, rng_city)
+                if SAMPLE_INDEX is None:
+                    print("Too many invalid house attempts, trying a different city")
+                    driver.get(INDEX_URL)
+                    page_ready(driver, "index")
                     continue
-                else:
-                    if num_residents == 1:
-                        rng_person = 0
+
+                # Click the house with proper error handling
+                try:
+                    if SAMPLE_INDEX < len(houses):
+                        with span("house click", house=int(SAMPLE_INDEX)):
+                            houses[SAMPLE_INDEX].click()
                     else:
-                        rng_person = np.random.randint(low=0, high=num_residents - 1)
+                        print(
+                            f"House index {SAMPLE_INDEX} out of range (max={len(houses)-1})"
+                        )
+                        driver.get(INDEX_URL)
+                        page_ready(driver, "index")
+                        continue
+                except (StaleElementReferenceException, IndexError) as e:
+                    print(f"Error clicking house: {e}")
+                    driver.get(INDEX_URL)
+                    page_ready(driver, "index")
+                    continue
+
+                # Find residents with proper waiting
+                try:
+                    resident_links = wait.until(
+                        EC.presence_of_all_elements_located(
+                            (By.XPATH, '//a[starts-with(@href, "islander.php")]')
+                        )
+                    )
+                    num_residents = len(resident_links)
 
-                    resident_links[rng_person].click()
-                    time.sleep(2)
+                    if num_residents == 0:
+                        print("empty house")
+                        driver.get(INDEX_URL)
+                        page_ready(driver, "index")
+                        continue
+                    else:
+                        if num_residents == 1:
+                            rng_person = 0
+                        else:
+                            rng_person = np.random.randint(low=0, high=num_residents - 1)
 
-                    # Get the name of the person
-                    try:
-                        isl = wait.until(
-                            EC.presence_of_element_located((By.ID, "title"))
+                        islander_href = relative_href(
+                            resident_links[rng_person].get_attribute("href")
                         )
-                        print("touched " + isl.text)
+                        with span("resident click", person=int(rng_person)):
+                            resident_links[rng_person].click()
+                        page_ready(driver, "islander")
 
-                        # Check if their age is in the right age range<span class="task" onclick="startTask('cannabis'); return false;">Tea Cannabis 250 mL</span>
+                        # Get the name of the person
                         try:
-                            tab = wait.until(
-                                EC.element_to_be_clickable((By.ID, "t1tab"))
+                            isl = wait.until(
+                                EC.presence_of_element_located((By.ID, "title"))
                             )
-                            tab.click()
-                            time.sleep(1)
-
-                            summary = driver.find_elements(By.XPATH, "//tr")
-                            if len(summary) > 1:
-                                age_text = summary[1].text.split()
-                                if len(age_text) > 0:
-                                    age = int(age_text[0])
-
-                                    if age >= MINIMUM_AGE and age <= MAXIMUM_AGE:
-                                        # Click the "Tasks" tab
-                                        try:
-                                            tab = wait.until(
-                                                EC.element_to_be_clickable(
-                                                    (By.ID, "t2tab")
+                            print("touched " + isl.text)
+
+                            # Check if their age is in the right age range<span class="task" onclick="startTask('cannabis'); return false;">Tea Cannabis 250 mL</span>
+                            try:
+                                tab = wait.until(
+                                    EC.element_to_be_clickable((By.ID, "t1tab"))
+                                )
+                                with span("tab switch", tab="t1tab"):
+                                    tab.click()
+                                    tab_ready(driver, 1)
+
+                                # Every stats row and the name in one round trip
+                                islander = extract_islander(driver)
+                                summary = islander["stats"]
+                                if len(summary) > 1:
+                                    age_text = summary[1].split()
+                                    if len(age_text) > 0:
+                                        age = int(age_text[0])
+
+                                        if age >= minimum_age and age <= maximum_age:
+                                            # The Stats tab is only readable before consent opens Tasks
+                                            info = None
+                                            if with_info:
+                                                info = info_record(
+                                                    islander["name"], parse_stats(summary)
                                                 )
-                                            )
-                                            tab.click()
-                                            time.sleep(1)
-
-                                            # Try to get consent
-                                            try:
-                                                obtain_elements = driver.find_elements(
-                                                    By.ID, "obtain"
+                                            if obtain_consent(driver, wait):
+                                                if with_info:
+                                                    info["gender"] = ask_gender(driver, wait)
+                                                people_sampled += 1
+                                                add_participant(
+                                                    found,
+                                                    journal,
+                                                    rng_city,
+                                                    SAMPLE_INDEX,
+                                                    rng_person,
+                                                    village_href,
+                                                    islander_href,
+                                                    info,
                                                 )
-
-                                                if len(obtain_elements) > 0:
-                                                    try:
-                                                        obtain = wait.until(
-                                                            EC.element_to_be_clickable(
-                                                                (
-                                                                    By.XPATH,
-                                                                    '//a[starts-with(@href, "javascript:getConsent")]',
-                                                                )
-                                                            )
-                                                        )
-                                                        obtain.click()
-                                                        time.sleep(1)
-
-                                                        # Check if consent was given
-                                                        task_result = (
-                                                            driver.find_elements(
-                                                                By.CLASS_NAME,
-                                                                "taskresulttask",
-                                                            )
-                                                        )
-                                                        if (
-                                                            task_result
-                                                            and "consented"
-                                                            in task_result[-1].text
-                                                        ):
-                                                            print("consented")
-                                                            people_sampled += 1
-                                                            city.append(rng_city)
-                                                            housers.append(SAMPLE_INDEX)
-                                                            persons.append(rng_person)
-                                                            print(
-                                                                f"Found {people_sampled} of {SAMPLE_SIZE} participants"
-                                                            )
-                                                        else:
-                                                            print(
-                                                                "Person declined. sample again"
-                                                            )
-                                                    except Exception as e:
-                                                        print(
-                                                            f"Error getting consent: {e}"
-                                                        )
-                                                else:
-                                                    print("No obtain element found")
-                                            except Exception as e:
                                                 print(
-                                                    f"Error with consent section: {e}"
+                                                    f"Found {people_sampled} of {sample_size} participants"
                                                 )
-                                        except Exception as e:
-                                            print(f"Error with tasks tab: {e}")
+                                        else:
+                                            print(f"Incorrect age ({age}). sample again")
                                     else:
-                                        print(f"Incorrect age ({age}). sample again")
+                                        print("Could not parse age")
                                 else:
-                                    print("Could not parse age")
-                            else:
-                                print("Summary table not found")
+                                    print("Summary table not found")
+                            except Exception as e:
+                                print(f"Error with age check: {e}")
                         except Exception as e:
-                            print(f"Error with age check: {e}")
-                    except Exception as e:
-                        print(f"Error getting person info: {e}")
+                            print(f"Error getting person info: {e}")
+                except Exception as e:
+                    print(f"Error finding residents: {e}")
             except Exception as e:
-                print(f"Error finding residents: {e}")
-        except Exception as e:
-            print(f"Error finding houses: {e}")
+                print(f"Error finding houses: {e}")
+
+            # Return to index page for next iteration
+            try:
+                with span("return to index"):
+                    driver.get(INDEX_URL)
+                    page_ready(driver, "index")
+            except Exception as e:
+                print(f"Error returning to index: {e}")
 
-        # Return to index page for next iteration
-        try:
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
         except Exception as e:
-            print(f"Error returning to index: {e}")
+            print(f"Unexpected error: {e}")
+            # Try to recover and continue
+            try:
+                driver.get(INDEX_URL)
+                page_ready(driver, "index")
+            except:
+                print("Could not recover, restarting browser")
+                driver.quit()
+                driver = start_logged_in_driver(session_id)
 
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        # Try to recover and continue
+    return driver
+
+
+################################################################################################################
+## STAGE
+################################################################################################################
+
+
+def find_participants(
+    sample_size,
+    minimum_age,
+    maximum_age,
+    use_http=False,
+    use_census=True,
+    with_info=False,
+    resume=False,
+    driver=None,
+):
+    """Find and consent participants, write participant_ids.csv and return (people found, driver)
+
+    with_info also writes participant_info.csv from the same visits. Every participant is
+    journaled as they consent; resume carries on from the journal of an interrupted run.
+    Pass a logged-in driver to reuse it; the returned driver is the one to keep using (a new
+    one if Chrome had to be restarted)
+    """
+    census = load_census() if use_census else None
+    journal = Journal("find_participants", resume)
+    found = list(journal.entries)
+
+    if journal.finished:
+        # participant_ids.csv was already written from this journal
+        journal.close()
+        return len(found), driver
+
+    if len(found) >= sample_size:
+        print(f"All {sample_size} participants were already found")
+    elif census is not None:
+        print(f"Sampling from the census of {census[1]['num_islanders']} islanders")
+        driver = sample_with_census(
+            census[0],
+            sample_size,
+            minimum_age,
+            maximum_age,
+            found,
+            journal,
+            with_info,
+            driver,
+        )
+    elif use_http:
+        driver = sample_with_http(
+            sample_size, minimum_age, maximum_age, found, journal, with_info, driver
+        )
+    else:
+        driver = sample_with_selenium(
+            sample_size, minimum_age, maximum_age, found, journal, with_info, driver
+        )
+
+    people_sampled = len(found)
+
+    ## Create data frame and write to csv
+    data = pd.DataFrame(
+        [
+            {key: value for key, value in participant.items() if key != "info"}
+            for participant in found
+        ],
+        columns=[
+            "city_index",
+            "sample_index",
+            "person_index",
+            "village_href",
+            "islander_href",
+        ],
+    )
+
+    print(data.head())
+    try:
+        data.to_csv("participant_ids.csv")
+    except:
+        print("Unable to save participant_ids, so here they are: \n")
+        print(data)
+        journal.close()
+        return people_sampled, driver
+
+    with ResultsStore() as store:
+        store.add_participants(found)
+
+    if with_info:
+        # Participants journaled without info (an earlier run without --with-info) get blanks
+        infos = [participant["info"] or empty_record() for participant in found]
+        info = pd.DataFrame(infos, columns=INFO_COLUMNS)
+        print(info.head())
         try:
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
+            info.to_csv("participant_info.csv")
+            print("Data saved successfully to participant_info.csv")
         except:
-            print("Could not recover, restarting browser")
-            driver.quit()
-            driver = webdriver.Chrome(options=chrome_options)
-            driver.get("https://islands.smp.uq.edu.au/index.php")
-            time.sleep(2)
-
-## Create data frame and write to csv
-data = pd.DataFrame(
-    {
-        "city_index": city,
-        "sample_index": housers,
-        "person_index": persons,
-    }
-)
+            print("Unable to save participant_info, so here it is: \n")
+            print(info)
+            journal.close()
+            return people_sampled, driver
 
-print(data.head())
-try:
-    data.to_csv("participant_ids.csv")
-except:
-    print("Unable to save participant_ids, so here they are: \n")
-    print(data)
+    journal.finish()
+    return people_sampled, driver
 
-end_time = time.time()
 
-if __name__ == "__main__":
+################################################################################################################
+## RUN
+################################################################################################################
+
+
+def main():
+    args = parser.parse_args()
+    sample_size, minimum_age, maximum_age = read_criteria(args)
+
+    start_time = time.time()
+
+    people_sampled, driver = find_participants(
+        sample_size,
+        minimum_age,
+        maximum_age,
+        use_http=args.http,
+        use_census=not args.no_census,
+        with_info=args.with_info,
+        resume=args.resume,
+    )
+
+    end_time = time.time()
+
     execution_time = end_time - start_time
     print("Script completed normally.")
     print("Script runtime: " + str(datetime.timedelta(seconds=execution_time)))
     print(f"Successfully found {people_sampled} participants.")
 
-    time.sleep(10)
-    driver.close()
+    if driver is not None:
+        time.sleep(10)
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+
+"""
+HTTP-only backend for the read-only pages of The Islands
+
+fetches index.php, village, house and islander pages with a pooled HTTP client
+using the PHPSESSID from the session_cookie file and parses the HTML directly,
+so Chrome is only needed for pages that run JavaScript (consent, tasks, chat)
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import asyncio
+import sys
+
+import httpx
+
+from session import BASE_URL
+from tracing import span
+
+################################################################################################################
+## HTML PARSING
+################################################################################################################
+
+# Elements that never have a closing tag
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+
+
+class Node:
+    """A very small DOM element: tag, attributes, children and text"""
+
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children = []
+        self.parent = parent
+
+    def iter(self):
+        """Yield every element below this one in document order"""
+        for child in self.children:
+            if isinstance(child, Node):
+                yield child
+                yield from child.iter()
+
+    def find_all(self, predicate):
+        return [node for node in self.iter() if predicate(node)]
+
+    def find(self, predicate):
+        for node in self.iter():
+            if predicate(node):
+                return node
+        return None
+
+    def has_class(self, name):
+        return name in self.attrs.get("class", "").split()
+
+    @property
+    def text(self):
+        """Whitespace-normalised text, roughly what Selenium's .text returns"""
+        parts = []
+
+        def walk(node):
+            for child in node.children:
+                if isinstance(child, Node):
+                    if child.tag not in ("script", "style"):
+                        walk(child)
+                else:
+                    parts.append(child)
+
+        walk(self)
+        return " ".join(" ".join(parts).split())
+
+
+class TreeBuilder(HTMLParser):
+    """Build a Node tree from (possibly sloppy) HTML"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("document")
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {k: (v or "") for k, v in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {k: (v or "") for k, v in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        # Close back to the matching open tag, ignoring stray end tags
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def parse_html(html):
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def element_href(node):
+    """Find where clicking an element leads: its own href, an enclosing or inner anchor, or an onclick location"""
+    current = node
+    while current is not None:
+        if current.tag == "a" and current.attrs.get("href"):
+            return current.attrs["href"]
+        current = current.parent
+
+    inner = node.find(lambda n: n.tag == "a" and n.attrs.get("href"))
+    if inner is not None:
+        return inner.attrs["href"]
+
+    onclick = node.attrs.get("onclick", "")
+    for quote in ("'", '"'):
+        if "location" in onclick and quote in onclick:
+            return onclick.split(quote)[1]
+
+    return None
+
+
+################################################################################################################
+## PAGE PARSERS
+################################################################################################################
+
+
+def parse_index(root):
+    """Village hrefs for every city that has a clickable town button, in page order"""
+    hrefs = []
+    for anchor in root.find_all(
+        lambda n: n.tag == "a" and n.attrs.get("href", "").startswith("village")
+    ):
+        button = anchor.find(
+            lambda n: n.tag == "div"
+            and (
+                n.attrs.get("class", "").startswith("town town")
+                or n.attrs.get("class", "").startswith("towndot towndot")
+            )
+        )
+        if button is not None:
+            hrefs.append(anchor.attrs["href"])
+    return hrefs
+
+
+def parse_village(root):
+    """Title, house ids and house hrefs of a village page"""
+    title = root.find(lambda n: n.attrs.get("id") == "title")
+    houses = root.find_all(lambda n: n.has_class("house"))
+    ids = root.find_all(lambda n: n.has_class("houseid"))
+    return {
+        "title": title.text if title is not None else "",
+        "house_ids": [id.text for id in ids],
+        "house_hrefs": [element_href(house) for house in houses],
+    }
+
+
+def parse_house(root):
+    """Islander hrefs of the residents of a house, in page order"""
+    return [
+        anchor.attrs["href"]
+        for anchor in root.find_all(
+            lambda n: n.tag == "a"
+            and n.attrs.get("href", "").startswith("islander.php")
+        )
+    ]
+
+
+def crumb_name(crumb_text):
+    """The islander's name from the breadcrumb header of their page, or NA"""
+    header = crumb_text.split()
+    if len(header) >= 3:
+        return header[1] + " " + header[2]
+    return "NA"
+
+
+def parse_islander(root):
+    """Everything the scripts read from an islander page"""
+    title = root.find(lambda n: n.attrs.get("id") == "title")
+    crumb = root.find(lambda n: n.has_class("crumb"))
+
+    return {
+        "title": title.text if title is not None else "",
+        "name": crumb_name(crumb.text) if crumb is not None else "NA",
+        "stats": [row.text for row in root.find_all(lambda n: n.tag == "tr")],
+        "task_results": [
+            n.text for n in root.find_all(lambda n: n.has_class("taskresulttask"))
+        ],
+        "results": [
+            n.text for n in root.find_all(lambda n: n.has_class("taskresultresult"))
+        ],
+        "chat": [n.text for n in root.find_all(lambda n: n.has_class("chatbot"))],
+    }
+
+
+def parse_stats(summary):
+    """Age, education, income, island and house number from the Stats tab rows (as text)"""
+    stats = {
+        "age": 0,
+        "island": "NA",
+        "house_num": 0,
+        "education_level": "none",
+        "income": 0,
+    }
+
+    # Education
+    summary_string = " " + " ".join(summary)
+    if summary_string.find("University") != -1:
+        stats["education_level"] = "university"
+    elif summary_string.find("High School") != -1:
+        stats["education_level"] = "high school"
+    elif summary_string.find("Elementary School") != -1:
+        stats["education_level"] = "elementary school"
+
+    # Age
+    if len(summary) > 1:
+        age_parts = summary[1].split()
+        if len(age_parts) > 0:
+            stats["age"] = age_parts[0]
+
+    # Income, Island, House number
+    for row in summary:
+        if "$" in row:
+            income_text = row.split("$")
+            if len(income_text) > 1:
+                stats["income"] = income_text[1].replace(",", "")
+
+        if "Lives in" in row:
+            location = row.split()
+            if len(location) > 3:
+                stats["island"] = location[2]
+                stats["house_num"] = location[3]
+
+    return stats
+
+
+################################################################################################################
+## CLIENT
+################################################################################################################
+
+
+class LoginError(Exception):
+    """Raised when the site redirects to login.php"""
+
+
+def check_response(response):
+    """Raise if a response bounced to the login page or failed"""
+    if "login.php" in str(response.url):
+        raise LoginError("Redirected to login page. Check if your session ID is valid.")
+    response.raise_for_status()
+
+
+def client_options(session_id, max_connections, timeout):
+    """Keyword arguments shared by the sync and async httpx clients"""
+    return {
+        "cookies": {"PHPSESSID": session_id},
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+        "timeout": timeout,
+        "follow_redirects": True,
+    }
+
+
+class HttpBackend:
+    """Pooled HTTP client that reads The Islands pages without a browser"""
+
+    def __init__(self, session_id, base_url=BASE_URL, max_connections=10, timeout=10.0):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.client = httpx.Client(
+            **client_options(session_id, max_connections, timeout)
+        )
+        self._village_hrefs = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.client.close()
+
+    def url(self, href):
+        return urljoin(self.base_url, href)
+
+    def fetch(self, href):
+        """GET a page and return its parsed tree"""
+        with span("http fetch", href=href):
+            response = self.client.get(self.url(href))
+        check_response(response)
+        with span("parse html"):
+            return parse_html(response.text)
+
+    def login(self):
+        """Fetch index.php once so an invalid session fails before any work starts"""
+        try:
+            self.village_hrefs()
+        except LoginError as e:
+            print(f"Login failed - {e}")
+            self.close()
+            sys.exit(1)
+        print("Successfully logged in!")
+
+    def village_hrefs(self):
+        """Village hrefs indexed the same way as the city buttons on index.php"""
+        if self._village_hrefs is None:
+            self._village_hrefs = parse_index(self.fetch("index.php"))
+        return self._village_hrefs
+
+    def village(self, city_index):
+        hrefs = self.village_hrefs()
+        if city_index < 0 or city_index >= len(hrefs):
+            raise IndexError(f"City index {city_index} out of range")
+        return parse_village(self.fetch(hrefs[city_index]))
+
+    def residents(self, village, sample_index):
+        """Islander hrefs of the house at sample_index on an already-parsed village page"""
+        if sample_index < 0 or sample_index >= len(village["house_hrefs"]):
+            raise IndexError(f"House index {sample_index} out of range")
+        house_href = village["house_hrefs"][sample_index]
+        if house_href is None:
+            raise ValueError(f"House {sample_index} has no link to follow")
+        return parse_house(self.fetch(house_href))
+
+    def resolve_islander(self, city_index, sample_index, person_index):
+        """Follow city -> house -> resident and return the islander.php href"""
+        residents = self.residents(self.village(city_index), sample_index)
+        if len(residents) == 0:
+            raise ValueError("Empty house, no residents found")
+        if person_index < 0 or person_index >= len(residents):
+            print(f"Warning: Person index {person_index} out of range, using index 0")
+            person_index = 0
+        return residents[person_index]
+
+    def islander(self, href):
+        return parse_islander(self.fetch(href))
+
+
+class AsyncHttpBackend:
+    """asyncio version of HttpBackend that fetches many pages at once over one connection pool"""
+
+    def __init__(self, session_id, base_url=BASE_URL, concurrency=8, timeout=10.0):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.client = httpx.AsyncClient(
+            **client_options(session_id, concurrency, timeout)
+        )
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._village_hrefs = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self.client.aclose()
+
+    def url(self, href):
+        return urljoin(self.base_url, href)
+
+    async def fetch(self, href):
+        """GET a page and return its parsed tree, with at most `concurrency` requests in flight"""
+        async with self.semaphore:
+            response = await self.client.get(self.url(href))
+        check_response(response)
+        return parse_html(response.text)
+
+    async def login(self):
+        """Fetch index.php once so an invalid session fails before any work starts"""
+        try:
+            await self.village_hrefs()
+        except LoginError as e:
+            print(f"Login failed - {e}")
+            await self.close()
+            sys.exit(1)
+        print("Successfully logged in!")
+
+    async def village_hrefs(self):
+        """Village hrefs indexed the same way as the city buttons on index.php"""
+        if self._village_hrefs is None:
+            self._village_hrefs = parse_index(await self.fetch("index.php"))
+        return self._village_hrefs
+
+    async def village(self, city_index):
+        hrefs = await self.village_hrefs()
+        if city_index < 0 or city_index >= len(hrefs):
+            raise IndexError(f"City index {city_index} out of range")
+        return parse_village(await self.fetch(hrefs[city_index]))
+
+    async def villages(self, city_indices=None):
+        """Fetch several village pages concurrently, returned in the order asked for"""
+        if city_indices is None:
+            city_indices = range(len(await self.village_hrefs()))
+        return await asyncio.gather(*(self.village(i) for i in city_indices))
+
+    async def residents(self, village, sample_index):
+        """Islander hrefs of the house at sample_index on an already-parsed village page"""
+        if sample_index < 0 or sample_index >= len(village["house_hrefs"]):
+            raise IndexError(f"House index {sample_index} out of range")
+        house_href = village["house_hrefs"][sample_index]
+        if house_href is None:
+            raise ValueError(f"House {sample_index} has no link to follow")
+        return parse_house(await self.fetch(house_href))
+
+    async def islander(self, href):
+        return parse_islander(await self.fetch(href))
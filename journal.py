@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+crash-safe checkpoint journal
+
+each stage appends one JSON line per finished participant to journal/<stage>.jsonl
+and fsyncs it, so a crash loses at most the participant in progress. With --resume
+a stage reads its journal back, skips the work it already did and rebuilds its CSV
+from it. Once a stage has written its output it marks the journal finished, and
+resuming a finished stage does nothing. Without --resume a stage starts a new journal.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+import json
+import os
+
+################################################################################################################
+## CONSTANTS
+################################################################################################################
+
+JOURNAL_DIR = "journal"
+
+# Last line of a journal whose stage wrote its output
+FINISHED = {"finished": True}
+
+################################################################################################################
+## JOURNAL
+################################################################################################################
+
+
+def read_entries(path):
+    """Read the entries of a journal, dropping a last line that was torn by a crash"""
+    entries = []
+    try:
+        with open(path, "r") as journal_file:
+            for line in journal_file:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"Ignoring a damaged line in {path}")
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class Journal:
+    """Append-only JSONL journal of one stage's finished work
+
+    every line is written with a single O_APPEND write, so worker processes can share a journal
+    """
+
+    def __init__(self, stage, resume=False, directory=JOURNAL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.stage = stage
+        self.path = os.path.join(directory, f"{stage}.jsonl")
+        self.entries = []
+        self.finished = False
+
+        previous = read_entries(self.path)
+        if resume:
+            self.finished = FINISHED in previous
+            self.entries = [entry for entry in previous if entry != FINISHED]
+            # Rewrite without any torn line so new entries start on a line of their own
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as journal_file:
+                for entry in previous:
+                    journal_file.write(json.dumps(entry) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            os.replace(tmp_path, self.path)
+            if self.finished:
+                print(f"{stage} already finished, nothing to resume")
+            elif self.entries:
+                print(f"Resuming {stage} from {len(self.entries)} journaled entries")
+        elif previous:
+            # Keep the last journal around in case --resume was forgotten
+            old_path = self.path + ".old"
+            os.replace(self.path, old_path)
+            if FINISHED not in previous:
+                print(
+                    f"Moved the unfinished {stage} journal to {old_path}, pass --resume to continue a run instead"
+                )
+
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    @classmethod
+    def attach(cls, stage, directory=JOURNAL_DIR):
+        """Open a journal that another process set up, for appending only (e.g. from a worker)"""
+        journal = cls.__new__(cls)
+        journal.stage = stage
+        journal.path = os.path.join(directory, f"{stage}.jsonl")
+        journal.entries = []
+        journal.finished = False
+        journal.fd = os.open(journal.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        return journal
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, entry):
+        """Durably record one finished piece of work"""
+        os.write(self.fd, (json.dumps(entry) + "\n").encode())
+        os.fsync(self.fd)
+        self.entries.append(entry)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def finish(self):
+        """Mark the stage as done once its output is written"""
+        self.append(FINISHED)
+        self.entries.pop()
+        self.finished = True
+        self.close()
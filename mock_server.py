@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+
+"""
+local stand-in for The Islands
+
+serves login.php, index.php, village, house and islander.php pages for a fixture
+world (cities, houses and islanders saved as JSON, generated from a seed the
+first time), with the same ids and classes the scripts look for. Consent, tasks
+and chat are scripted: consent is decided per islander, a started task shows in
+the detail box and posts its result after --task-seconds, and the chat answers
+the gender question. Every request waits --latency seconds give or take
+--jitter, so stages can be timed reproducibly without the live site. Point the
+scripts at it with
+
+    python3 mock_server.py --port 8000 &
+    ISLANDS_BASE_URL=http://127.0.0.1:8000 python3 find_participants.py 10 18 75
+
+any non-empty PHPSESSID is accepted unless --session is given.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from urllib.parse import urlparse, parse_qs
+from html import escape
+import threading
+import argparse
+import random
+import json
+import time
+import os
+
+from do_task import task_menu
+
+parser = argparse.ArgumentParser(description="Serve a local mock of The Islands")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8000)
+parser.add_argument(
+    "--fixtures",
+    default="fixtures/world.json",
+    help="fixture world to serve, generated from --seed if the file doesn't exist",
+)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--cities", type=int, default=10, help="cities in a generated world")
+parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+parser.add_argument("--jitter", type=float, default=0.02, help="random +/- seconds on the latency")
+parser.add_argument(
+    "--task-seconds", type=float, default=1.0, help="how long a started task runs before its result"
+)
+parser.add_argument(
+    "--consent-rate", type=float, default=0.8, help="share of islanders who consent"
+)
+parser.add_argument("--session", help="only accept this PHPSESSID")
+parser.add_argument(
+    "--asset-kb",
+    type=int,
+    default=200,
+    help="size of each image, font and stylesheet the pages load, like the map imagery of the real site",
+)
+
+################################################################################################################
+## FIXTURES
+################################################################################################################
+
+CITY_NAMES = [
+    "Akkeri", "Bjurholm", "Colmar", "Dalby", "Eskund", "Firgas", "Gamlebyen", "Hayarden",
+    "Ironbark", "Jarva", "Kinsale", "Litla", "Maeva", "Nidoma", "Okaro", "Provo",
+]
+FIRST_NAMES = [
+    "Aiko", "Bruno", "Chiara", "Dmitri", "Elena", "Farid", "Greta", "Hugo", "Ines", "Jonas",
+    "Kaia", "Luca", "Mira", "Nils", "Olga", "Pavel", "Rosa", "Sven", "Talia", "Viktor",
+]
+LAST_NAMES = [
+    "Aalto", "Berg", "Costa", "Dahl", "Eriksen", "Fontaine", "Gruber", "Holm", "Ivanova",
+    "Jensen", "Kowalski", "Lindqvist", "Moreau", "Novak", "Olsen", "Petrov", "Rossi", "Silva",
+]
+EDUCATION = ["None", "Elementary School", "High School", "University"]
+
+
+def generate_world(seed=0, num_cities=10):
+    """A random but reproducible island world: cities of houses (with gaps in their ids) of islanders"""
+    rng = random.Random(seed)
+    cities = []
+    islanders = {}
+    for city_index in range(num_cities):
+        name = CITY_NAMES[city_index % len(CITY_NAMES)]
+        if city_index >= len(CITY_NAMES):
+            name += str(city_index // len(CITY_NAMES) + 1)
+        houses = []
+        house_id = 0
+        for _ in range(rng.randint(20, 60)):
+            house_id += rng.randint(1, 3)
+            residents = []
+            for _ in range(rng.choice([0, 1, 2, 2, 3, 4, 5])):
+                islander_id = len(islanders) + 1
+                islanders[str(islander_id)] = {
+                    "first_name": rng.choice(FIRST_NAMES),
+                    "last_name": rng.choice(LAST_NAMES),
+                    "age": rng.randint(1, 95),
+                    "gender": rng.choice(["male", "female"]),
+                    "education": rng.choice(EDUCATION),
+                    "income": rng.randrange(0, 150000, 500),
+                    "city": city_index,
+                    "house": house_id,
+                    "consents": rng.random(),
+                }
+                residents.append(islander_id)
+            houses.append({"id": house_id, "residents": residents})
+        cities.append({"name": name, "houses": houses})
+    return {"cities": cities, "islanders": islanders}
+
+
+def load_world(path, seed=0, num_cities=10):
+    """Read a fixture world, generating and saving it first if there isn't one"""
+    try:
+        with open(path, "r") as world_file:
+            return json.load(world_file)
+    except FileNotFoundError:
+        world = generate_world(seed, num_cities)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as world_file:
+            json.dump(world, world_file)
+        print(f"Generated a world of {len(world['islanders'])} islanders in {path}")
+        return world
+
+
+################################################################################################################
+## PAGES
+################################################################################################################
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>The Islands</title>
+<link rel="stylesheet" href="static/islands.css">
+</head>
+<body>
+<a class="menu" href="index.php">Islands</a>
+{body}
+</body></html>
+"""
+
+# Static files the pages load, served as padding of --asset-kb: path -> content type
+ASSETS = {
+    "islands.css": "text/css",
+    "islands.woff2": "font/woff2",
+    "map.png": "image/png",
+    "village.jpg": "image/jpeg",
+    "portrait.png": "image/png",
+}
+STYLESHEET = """
+@font-face { font-family: Islands; src: url("islands.woff2"); }
+body { font-family: Islands, sans-serif; }
+"""
+
+ISLANDER_SCRIPT = """
+<script>
+var ISLANDER = %d;
+function showTab(n) {
+    for (var i = 1; i <= 3; i++) {
+        document.getElementById('t' + i).style.display = i == n ? 'block' : 'none';
+    }
+}
+function post(path, data) {
+    return fetch(path, {method: 'POST', body: new URLSearchParams(data)}).then(function (r) { return r.json(); });
+}
+function addResult(task, result, atEnd) {
+    var row = document.createElement('div');
+    row.className = 'taskresult';
+    row.innerHTML = '<span class="taskresulttask"></span> <span class="taskresultresult"></span>';
+    row.children[0].textContent = task;
+    row.children[1].textContent = result;
+    var list = document.getElementById('taskresults');
+    list.insertBefore(row, atEnd ? null : list.firstChild);
+}
+function getConsent() {
+    post('api/consent.php', {id: ISLANDER}).then(function (reply) {
+        addResult(reply.text, '', true);
+        if (reply.consented) {
+            document.getElementById('obtain').remove();
+            document.getElementById('task_menu').style.display = 'block';
+        }
+    });
+}
+function startTask(code) {
+    post('api/task.php', {id: ISLANDER, task: code}).then(function (reply) {
+        if (!reply.started) { addResult(reply.text, '', true); return; }
+        var box = document.getElementById('detailbox');
+        box.style.display = 'block';
+        document.getElementById('detail').textContent = reply.name + ' in progress';
+        if (!document.getElementById('progress')) {
+            var canvas = document.createElement('canvas');
+            canvas.id = 'progress';
+            box.appendChild(canvas);
+        }
+        setTimeout(function () {
+            addResult(reply.name, reply.result, false);
+            box.style.display = 'none';
+            var progress = document.getElementById('progress');
+            if (progress) { progress.remove(); }
+        }, reply.seconds * 1000);
+    });
+}
+function sendChat() {
+    var chatbox = document.getElementById('chatbox');
+    post('api/chat.php', {id: ISLANDER, message: chatbox.value}).then(function (reply) {
+        var line = document.createElement('div');
+        line.className = 'chatbot';
+        line.textContent = reply.text;
+        var chat = document.getElementById('chat');
+        chat.insertBefore(line, chat.firstChild);
+    });
+    chatbox.value = '';
+    return false;
+}
+</script>
+"""
+
+
+def render_index(world):
+    cities = "\n".join(
+        f'<a href="village.php?id={index}"><div class="town town{index}">{escape(city["name"])}</div></a>'
+        for index, city in enumerate(world["cities"])
+    )
+    return PAGE.format(body=f'<img src="static/map.png">\n<div id="map">\n{cities}\n</div>')
+
+
+def render_village(world, city_index):
+    city = world["cities"][city_index]
+    houses = "\n".join(
+        f'<a href="house.php?city={city_index}&amp;house={house["id"]}">'
+        f'<div class="house"><span class="houseid">{house["id"]}</span></div></a>'
+        for house in city["houses"]
+    )
+    return PAGE.format(
+        body=f'<img src="static/village.jpg">\n<div id="title">{escape(city["name"])}</div>\n{houses}'
+    )
+
+
+def render_house(world, city_index, house_id):
+    city = world["cities"][city_index]
+    house = next(house for house in city["houses"] if house["id"] == house_id)
+    residents = "\n".join(
+        f'<a href="islander.php?id={islander_id}">{full_name(world["islanders"][str(islander_id)])}</a>'
+        for islander_id in house["residents"]
+    )
+    return PAGE.format(
+        body=f'<div id="title">{escape(city["name"])} house {house_id}</div>\n{residents}'
+    )
+
+
+def full_name(islander):
+    return escape(f"{islander['first_name']} {islander['last_name']}")
+
+
+def render_islander(world, islander_id, consented, results):
+    islander = world["islanders"][str(islander_id)]
+    city = world["cities"][islander["city"]]["name"]
+    name = full_name(islander)
+
+    stats = [
+        name,
+        f"{islander['age']} years old",
+        f"Education: {islander['education']}",
+        f"Annual income ${islander['income']:,}",
+        f"Lives in {escape(city)} {islander['house']}",
+    ]
+    stats_rows = "\n".join(f"<tr><td>{row}</td></tr>" for row in stats)
+
+    menus = []
+    for category, entry in task_menu.items():
+        slug = category.split()[0].lower()
+        spans = "\n".join(
+            f"<span onclick=\"startTask('{code}')\">{escape(task)}</span>"
+            for task, code in entry["tasks"].items()
+        )
+        menus.append(
+            f'<div class="category">{escape(category)}</div>'
+            f'<div id="tasks{slug}" style="display: none">\n{spans}\n</div>'
+        )
+    obtain = ""
+    if not consented:
+        obtain = '<div id="obtain"><a href="javascript:getConsent()">Obtain consent</a></div>'
+    result_rows = "\n".join(
+        f'<div class="taskresult"><span class="taskresulttask">{escape(task)}</span> '
+        f'<span class="taskresultresult">{escape(str(result))}</span></div>'
+        for task, result in results
+    )
+
+    body = f"""
+<img src="static/portrait.png">
+<div class="crumb">{escape(city)} {name}</div>
+<div id="title">{name}</div>
+<div id="t1tab" onclick="showTab(1)">Stats</div>
+<div id="t2tab" onclick="showTab(2)">Tasks</div>
+<div id="t3tab" onclick="showTab(3)">Chat</div>
+<div id="t1"><table>
+{stats_rows}
+</table></div>
+<div id="t2" style="display: none">
+{obtain}
+<div id="task_menu" style="display: {'block' if consented else 'none'}">
+{"".join(menus)}
+</div>
+<div id="detailbox" style="display: none"><div id="detail"></div></div>
+<div id="taskresults">
+{result_rows}
+</div>
+</div>
+<div id="t3" style="display: none">
+<form onsubmit="return sendChat()"><input id="chatbox" type="text"><button type="submit">Send</button></form>
+<div id="chat"></div>
+</div>
+"""
+    return PAGE.format(body=body + ISLANDER_SCRIPT % islander_id)
+
+
+################################################################################################################
+## SERVER
+################################################################################################################
+
+
+class MockIslands:
+    """The fixture world plus what has happened to it: consents given and tasks run"""
+
+    def __init__(
+        self,
+        world,
+        latency=0.05,
+        jitter=0.02,
+        task_seconds=1.0,
+        consent_rate=0.8,
+        session=None,
+        seed=0,
+        asset_kb=200,
+    ):
+        self.world = world
+        self.latency = latency
+        self.jitter = jitter
+        self.task_seconds = task_seconds
+        self.consent_rate = consent_rate
+        self.session = session
+        self.asset_kb = asset_kb
+        self.rng = random.Random(seed)
+        self.task_names = {
+            code: task for entry in task_menu.values() for task, code in entry["tasks"].items()
+        }
+        self.lock = threading.Lock()
+        self.consented = set()
+        self.results = {}  # islander id -> [(task name, result, time it is posted)], oldest first
+
+    def delay(self):
+        """Sleep for the configured latency give or take the jitter"""
+        with self.lock:
+            offset = self.rng.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, self.latency + offset))
+
+    def logged_in(self, session_id):
+        if not session_id:
+            return False
+        return self.session is None or session_id == self.session
+
+    def islander_results(self, islander_id):
+        """Task results posted so far, newest first"""
+        now = time.time()
+        with self.lock:
+            results = self.results.get(islander_id, [])
+            return [(task, result) for task, result, at in reversed(results) if at <= now]
+
+    def consent(self, islander_id):
+        islander = self.world["islanders"][str(islander_id)]
+        name = f"{islander['first_name']} {islander['last_name']}"
+        if islander["consents"] < self.consent_rate:
+            with self.lock:
+                self.consented.add(islander_id)
+            return {"consented": True, "text": f"{name} consented to take part"}
+        return {"consented": False, "text": f"{name} declined to take part"}
+
+    def start_task(self, islander_id, code):
+        with self.lock:
+            if islander_id not in self.consented:
+                return {"started": False, "text": "Consent is needed first"}
+            if code not in self.task_names:
+                return {"started": False, "text": f"Unknown task {code}"}
+            result = round(self.rng.uniform(1, 100), 1)
+            self.results.setdefault(islander_id, []).append(
+                (self.task_names[code], result, time.time() + self.task_seconds)
+            )
+        return {
+            "started": True,
+            "name": self.task_names[code],
+            "result": result,
+            "seconds": self.task_seconds,
+        }
+
+    def chat(self, islander_id, message):
+        islander = self.world["islanders"][str(islander_id)]
+        if "male" in message.lower():
+            return {"text": f"I am {islander['gender']}."}
+        return {"text": "Sorry, I don't understand."}
+
+
+def make_handler(islands):
+    """Request handler class serving one MockIslands"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out as separate writes, don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def send(self, status, body, content_type="text/html", location=None):
+            data = body.encode()
+            self.send_response(status)
+            if content_type.startswith("text/") or content_type == "application/json":
+                content_type += "; charset=utf-8"
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if location is not None:
+                self.send_header("Location", location)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_asset(self, name):
+            if name not in ASSETS:
+                return self.send(404, "Not found")
+            data = STYLESHEET if name.endswith(".css") else ""
+            data += " " * max(0, islands.asset_kb * 1024 - len(data))
+            self.send(200, data, ASSETS[name])
+
+        def session_id(self):
+            cookie = SimpleCookie(self.headers.get("Cookie", ""))
+            return cookie["PHPSESSID"].value if "PHPSESSID" in cookie else None
+
+        def do_GET(self):
+            islands.delay()
+            url = urlparse(self.path)
+            page = url.path.lstrip("/")
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+            if page.startswith("static/"):
+                return self.send_asset(page[len("static/") :])
+            if page in ("", "login.php"):
+                return self.send(200, PAGE.format(body='<div id="title">Log in</div>'))
+            if not islands.logged_in(self.session_id()):
+                return self.send(302, "", location="/login.php")
+
+            world = islands.world
+            try:
+                if page == "index.php":
+                    return self.send(200, render_index(world))
+                if page == "village.php":
+                    return self.send(200, render_village(world, int(query["id"])))
+                if page == "house.php":
+                    return self.send(
+                        200, render_house(world, int(query["city"]), int(query["house"]))
+                    )
+                if page == "islander.php":
+                    islander_id = int(query["id"])
+                    with islands.lock:
+                        consented = islander_id in islands.consented
+                    results = islands.islander_results(islander_id)
+                    return self.send(
+                        200, render_islander(world, islander_id, consented, results)
+                    )
+            except (KeyError, ValueError, IndexError, StopIteration):
+                pass
+            self.send(404, PAGE.format(body="Not found"))
+
+        def do_POST(self):
+            islands.delay()
+            length = int(self.headers.get("Content-Length", 0))
+            form = {
+                key: values[0]
+                for key, values in parse_qs(self.rfile.read(length).decode()).items()
+            }
+            if not islands.logged_in(self.session_id()):
+                return self.send(403, json.dumps({"error": "not logged in"}), "application/json")
+
+            page = urlparse(self.path).path.rsplit("/", 1)[-1]
+            try:
+                islander_id = int(form["id"])
+                if page == "consent.php":
+                    reply = islands.consent(islander_id)
+                elif page == "task.php":
+                    reply = islands.start_task(islander_id, form["task"])
+                elif page == "chat.php":
+                    reply = islands.chat(islander_id, form.get("message", ""))
+                else:
+                    return self.send(404, json.dumps({"error": "not found"}), "application/json")
+            except (KeyError, ValueError):
+                return self.send(400, json.dumps({"error": "bad request"}), "application/json")
+            self.send(200, json.dumps(reply), "application/json")
+
+    return Handler
+
+
+def start_server(islands, host="127.0.0.1", port=8000):
+    """Serve a MockIslands from a background thread, returning the server (call .shutdown() to stop)"""
+    server = ThreadingHTTPServer((host, port), make_handler(islands))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+################################################################################################################
+## RUN
+################################################################################################################
+
+
+def main():
+    args = parser.parse_args()
+
+    world = load_world(args.fixtures, args.seed, args.cities)
+    islands = MockIslands(
+        world,
+        latency=args.latency,
+        jitter=args.jitter,
+        task_seconds=args.task_seconds,
+        consent_rate=args.consent_rate,
+        session=args.session,
+        seed=args.seed,
+        asset_kb=args.asset_kb,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(islands))
+    print(
+        f"Serving {len(world['cities'])} cities and {len(world['islanders'])} islanders, "
+        f"use ISLANDS_BASE_URL=http://{args.host}:{args.port}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+"""
+shared navigation to a participant's islander page
+
+opens the islander.php href recorded in participant_ids.csv directly and only falls
+back to clicking index.php -> city -> house -> resident when there is no href
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (
+    MoveTargetOutOfBoundsException,
+    StaleElementReferenceException,
+)
+
+from urllib.parse import urljoin, urlparse
+
+import pandas as pd
+
+from session import BASE_URL, INDEX_URL
+from tracing import span
+from waits import page_ready
+
+################################################################################################################
+## HELPERS
+################################################################################################################
+
+
+def relative_href(url):
+    """Strip the site address from a URL so participant_ids.csv works against any base URL"""
+    parsed = urlparse(url)
+    href = parsed.path.lstrip("/")
+    if parsed.query:
+        href += "?" + parsed.query
+    return href
+
+
+def absolute_url(href):
+    return urljoin(BASE_URL + "/", href)
+
+
+def clean_href(value):
+    """Turn a participant_ids.csv cell into an href or None (older files have no href columns)"""
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return None
+
+
+def load_participant_rows(path="participant_ids.csv"):
+    """Read participant_ids.csv into a list of row dicts, keeping the original position"""
+    df = pd.read_csv(path)
+    rows = []
+    for position, record in enumerate(df.to_dict("records")):
+        rows.append(
+            {
+                "position": position,
+                "city_index": int(record["city_index"]),
+                "sample_index": int(record["sample_index"]),
+                "person_index": int(record["person_index"]),
+                "village_href": clean_href(record.get("village_href")),
+                "islander_href": clean_href(record.get("islander_href")),
+            }
+        )
+    return rows
+
+
+def close_extra_windows(driver, keep=()):
+    """Close any stray windows and switch back to the one we were on
+
+    the windows in keep (the other tabs of a TabScheduler) are left open
+    """
+    current = driver.current_window_handle
+    if len(driver.window_handles) > 1:
+        for handle in driver.window_handles:
+            if handle != current and handle not in keep:
+                driver.switch_to.window(handle)
+                driver.close()
+        driver.switch_to.window(current)
+
+    # Check we don't have other windows open already
+    assert set(driver.window_handles) <= set(keep) | {current}
+
+
+################################################################################################################
+## CLICK PATH
+################################################################################################################
+
+
+# The clickable button of one city on index.php (and how many there are), found in one query
+CITY_BUTTON_SCRIPT = r"""
+var buttons = [];
+document.querySelectorAll('a[href^="village"]').forEach(function (a) {
+    var button = a.querySelector('div[class^="town town"], div[class^="towndot towndot"]');
+    if (button) { buttons.push(button); }
+});
+var button = buttons[arguments[0]] || null;
+return {
+    count: buttons.length,
+    button: button,
+    href: button ? button.closest('a').getAttribute('href') : null
+};
+"""
+
+
+def locate_city(driver, city_index):
+    """(number of city buttons, the city's button or None, its village href) in one round trip"""
+    found = driver.execute_script(CITY_BUTTON_SCRIPT, city_index)
+    return found["count"], found["button"], found["href"]
+
+
+def city_on_map(city_index):
+    """Wait condition giving locate_city's result once index.php shows any city buttons"""
+
+    def condition(driver):
+        found = locate_city(driver, city_index)
+        return found if found[0] > 0 else False
+
+    return condition
+
+
+def click_city(driver, wait, city_index, attempts=3):
+    """Click a city button on index.php, returning False if the index is out of range
+
+    the button is looked up fresh for each attempt, so a map that re-rendered in between
+    (a stale element) just means another try; if clicking keeps failing the village href
+    is opened directly
+    """
+    for attempt in range(attempts):
+        # Make sure we're on the islands page
+        if "index.php" not in driver.current_url:
+            print("Not on index page, navigating back")
+            driver.get(INDEX_URL)
+
+        # Wait for the map, then resolve the button with one query
+        with span("city lookup"):
+            count, button, href = wait.until(city_on_map(city_index))
+
+        # Check if we have a valid city index
+        if button is None:
+            print(f"Warning: City index {city_index} out of range ({count} cities), skipping")
+            return False
+
+        # Click on the city
+        try:
+            with span("city click", city=city_index):
+                click_btn = ActionChains(driver)
+                click_btn.move_to_element(button)
+                click_btn.click()
+                click_btn.perform()
+            page_ready(driver, "village")
+            return True
+        except (StaleElementReferenceException, MoveTargetOutOfBoundsException):
+            print(f"Could not click city {city_index}, looking it up again ({attempt + 1}/{attempts})")
+
+    with span("open village", city=city_index):
+        driver.get(absolute_url(href))
+    page_ready(driver, "village")
+    return True
+
+
+def click_to_islander(
+    driver,
+    wait,
+    city_index,
+    sample_index,
+    person_index,
+    village_href=None,
+    visited=None,
+    keep=(),
+):
+    """Reach an islander by clicking city -> house -> resident, returning True once their page is open
+
+    when the village href is known the index.php step is skipped. visited is a dict of the
+    village and house pages the previous click-through went via (filled in here): the next
+    participant in the same city starts from that village, and one in the same house starts
+    from that house. Windows in keep are not closed as strays
+    """
+    if visited is None:
+        visited = {}
+    close_extra_windows(driver, keep)
+
+    same_city = visited.get("city_index") == city_index and visited.get("village_url")
+    same_house = same_city and visited.get("sample_index") == sample_index and visited.get("house_url")
+
+    if same_house:
+        with span("open house", house=sample_index):
+            driver.get(visited["house_url"])
+    else:
+        if same_city:
+            with span("open village", city=city_index):
+                driver.get(visited["village_url"])
+        elif village_href is not None:
+            with span("open village", city=city_index):
+                driver.get(absolute_url(village_href))
+        elif not click_city(driver, wait, city_index):
+            return False
+
+        close_extra_windows(driver, keep)
+
+        # Wait for houses to load
+        houses = wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "house")))
+        visited.clear()
+        visited.update(city_index=city_index, village_url=driver.current_url)
+
+        # Check if the sample index is valid
+        if sample_index < 0 or sample_index >= len(houses):
+            print(f"Warning: House index {sample_index} out of range, skipping")
+            return False
+
+        # Click the house
+        with span("house click", house=sample_index):
+            houses[sample_index].click()
+
+    # Wait for resident links to load
+    resident_links = wait.until(
+        EC.presence_of_all_elements_located(
+            (By.XPATH, '//a[starts-with(@href, "islander.php")]')
+        )
+    )
+    visited.update(sample_index=sample_index, house_url=driver.current_url)
+    num_residents = len(resident_links)
+
+    if num_residents == 0:
+        print("Empty house, no residents found")
+        return False
+
+    # Check if person index is valid
+    if person_index < 0 or person_index >= num_residents:
+        print(f"Warning: Person index {person_index} out of range, using index 0")
+        person_index = 0
+
+    # Click on the person
+    with span("resident click", person=person_index):
+        resident_links[person_index].click()
+    page_ready(driver, "islander")
+    return True
+
+
+################################################################################################################
+## DIRECT NAVIGATION
+################################################################################################################
+
+
+def plan_visits(rows):
+    """The rows in the order to visit them: city by city and house by house
+
+    consecutive participants then share their village and house pages (see click_to_islander);
+    every row keeps its position, so results can be put back in participant_ids.csv order
+    """
+    return sorted(rows, key=lambda row: (row["city_index"], row["sample_index"], row["position"]))
+
+
+def open_islander(driver, wait, row, visited=None, keep=()):
+    """Open a participant's islander page, directly by href when possible, returning True on success
+
+    there is no need to go back to index.php in between: pass the same visited dict for every
+    participant of a stage and one clicked through to starts from the village or house the
+    previous one was reached via. Windows in keep (other tabs in use) are not closed as strays
+    """
+    if row.get("islander_href") is not None:
+        try:
+            close_extra_windows(driver, keep)
+            with span("open islander", position=row["position"]):
+                driver.get(absolute_url(row["islander_href"]))
+            if page_ready(driver, "islander") and "islander.php" in driver.current_url:
+                return True
+            print("Direct link did not reach the islander, clicking through instead")
+        except Exception as e:
+            print(f"Error opening islander directly, clicking through instead: {e}")
+
+    return click_to_islander(
+        driver,
+        wait,
+        row["city_index"],
+        row["sample_index"],
+        row["person_index"],
+        row.get("village_href"),
+        visited,
+        keep,
+    )
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+"""
+SQLite results store
+
+replaces the numbered latest_result{N}.csv files. Every study writes into one
+results.db with three tables:
+
+    participants    one row per islander, by islander_href where it is known and by
+                    (city_index, sample_index, person_index) where it isn't
+    task_runs       every task started, keyed by participant, task code and start time
+    results         every result collected, keyed by participant and collection round,
+                    so collecting a round again replaces its rows
+
+each result is upserted as soon as it is read, so a longitudinal query is one
+SELECT instead of a pass over N CSVs matched up by row order. For a flat file,
+`python3 results_store.py --csv ROUND` exports one round.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+import pandas as pd
+
+import sqlite3
+import time
+import argparse
+
+################################################################################################################
+## CONSTANTS
+################################################################################################################
+
+RESULTS_DB = "results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS participants (
+    participant_id INTEGER PRIMARY KEY,
+    city_index INTEGER NOT NULL,
+    sample_index INTEGER NOT NULL,
+    person_index INTEGER NOT NULL,
+    village_href TEXT,
+    islander_href TEXT UNIQUE,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS task_runs (
+    participant_id INTEGER NOT NULL REFERENCES participants (participant_id),
+    task_code TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    PRIMARY KEY (participant_id, task_code, started_at)
+);
+CREATE TABLE IF NOT EXISTS results (
+    participant_id INTEGER NOT NULL REFERENCES participants (participant_id),
+    round INTEGER NOT NULL,
+    collected_at REAL NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    result NUMERIC,
+    PRIMARY KEY (participant_id, round)
+);
+CREATE INDEX IF NOT EXISTS participants_place ON participants (city_index, sample_index, person_index);
+CREATE INDEX IF NOT EXISTS results_round ON results (round, position);
+CREATE INDEX IF NOT EXISTS task_runs_code ON task_runs (task_code, started_at);
+"""
+
+parser = argparse.ArgumentParser(description="Show or export the collected results")
+parser.add_argument("--db", default=RESULTS_DB, help="results database to read")
+parser.add_argument(
+    "--csv",
+    type=int,
+    metavar="ROUND",
+    help="write one collection round to latest_result_round{ROUND}.csv",
+)
+
+################################################################################################################
+## STORE
+################################################################################################################
+
+
+class ResultsStore:
+    """Participants, task runs and results of every study in one SQLite file
+
+    every write is committed straight away, like the journals, so a crash keeps what was collected
+    """
+
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # Readers (e.g. an analyst's notebook) don't block collection
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        # islander_href, or (city_index, sample_index, person_index) where it isn't known -> participant_id
+        self.participant_ids = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def participant_id(self, row):
+        """Id of the participant in a participant_ids.csv row, adding them if they are new
+
+        a participant is the same islander_href wherever they are found; rows without one (older
+        participant_ids.csv files) are matched on their place instead
+        """
+        place = (row["city_index"], row["sample_index"], row["person_index"])
+        href = row.get("islander_href")
+        key = place if href is None else href
+        if key not in self.participant_ids:
+            with self.connection:
+                if href is not None:
+                    self.connection.execute(
+                        """
+                        INSERT INTO participants
+                            (city_index, sample_index, person_index, village_href, islander_href)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (islander_href) DO UPDATE SET
+                            city_index = excluded.city_index,
+                            sample_index = excluded.sample_index,
+                            person_index = excluded.person_index,
+                            village_href = coalesce(excluded.village_href, village_href)
+                        """,
+                        place + (row.get("village_href"), href),
+                    )
+                    found = self.connection.execute(
+                        "SELECT participant_id FROM participants WHERE islander_href = ?", (href,)
+                    ).fetchone()
+                else:
+                    found = self.connection.execute(
+                        """
+                        SELECT participant_id FROM participants
+                        WHERE city_index = ? AND sample_index = ? AND person_index = ?
+                        ORDER BY participant_id DESC LIMIT 1
+                        """,
+                        place,
+                    ).fetchone()
+                    if found is None:
+                        found = (
+                            self.connection.execute(
+                                """
+                                INSERT INTO participants
+                                    (city_index, sample_index, person_index, village_href)
+                                VALUES (?, ?, ?, ?)
+                                """,
+                                place + (row.get("village_href"),),
+                            ).lastrowid,
+                        )
+            (self.participant_ids[key],) = found
+        return self.participant_ids[key]
+
+    def add_participants(self, rows):
+        """Add every row of participant_ids.csv, returning their ids in row order"""
+        return [self.participant_id(row) for row in rows]
+
+    def next_round(self):
+        """Number for a new collection round, one more than the last one collected"""
+        (last,) = self.connection.execute("SELECT max(round) FROM results").fetchone()
+        return 0 if last is None else last + 1
+
+    def record_task_run(self, row, task_code, started_at):
+        """Record that a task started for a participant"""
+        participant_id = self.participant_id(row)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO task_runs VALUES (?, ?, ?)",
+                (participant_id, task_code, started_at),
+            )
+
+    def record_result(self, row, round, name, result, collected_at=None):
+        """Upsert a participant's result for a collection round, and learn their name
+
+        collecting the same round again replaces the participant's earlier result in it
+        """
+        if collected_at is None:
+            collected_at = time.time()
+        participant_id = self.participant_id(row)
+        with self.connection:
+            self.connection.execute(
+                """
+                INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (participant_id, round) DO UPDATE SET
+                    collected_at = excluded.collected_at,
+                    position = excluded.position,
+                    name = excluded.name,
+                    result = excluded.result
+                """,
+                (participant_id, round, collected_at, row["position"], name, result),
+            )
+            if name != "NA":
+                self.connection.execute(
+                    "UPDATE participants SET name = ? WHERE participant_id = ?",
+                    (name, participant_id),
+                )
+
+    def round_results(self, round):
+        """One round's results in participant_ids.csv order, as latest_result{N}.csv used to be"""
+        return pd.read_sql_query(
+            """
+            SELECT position, name, result, collected_at FROM results
+            WHERE round = ? ORDER BY position, collected_at
+            """,
+            self.connection,
+            params=(round,),
+        ).drop_duplicates("position", keep="last").set_index("position")
+
+    def rounds(self):
+        """Participants and collection time span of every round"""
+        return pd.read_sql_query(
+            """
+            SELECT round, count(DISTINCT participant_id) AS participants,
+                datetime(min(collected_at), 'unixepoch') AS started,
+                datetime(max(collected_at), 'unixepoch') AS finished
+            FROM results GROUP BY round ORDER BY round
+            """,
+            self.connection,
+        )
+
+
+################################################################################################################
+## RUN
+################################################################################################################
+
+
+def main():
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        if args.csv is None:
+            print(store.rounds().to_string(index=False))
+            return
+
+        data = store.round_results(args.csv)
+        filename = f"latest_result_round{args.csv}.csv"
+        data.to_csv(filename)
+        print(f"Round {args.csv} ({len(data)} participants) saved to {filename}")
+
+
+if __name__ == "__main__":
+    main()
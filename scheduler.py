@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+per-participant protocol scheduler
+
+runs a protocol (a list of steps, each with a delay) for every participant. Each
+step is queued for the moment that participant's own delay since their previous
+step expires, so participant 100 is measured as long after their cannabis as
+participant 1 is. A heap of due times always picks the next step to run. With a
+journal every step run is recorded, and a resumed run carries on from each
+participant's last journaled step.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+import heapq
+import time
+import datetime
+
+################################################################################################################
+## SCHEDULER
+################################################################################################################
+
+
+class ProtocolScheduler:
+    """Run protocol steps for each participant when their own delay expires
+
+    protocol is a list of (kind, value, delay) where delay is the number of seconds after
+    the participant's previous step. handlers maps each kind to a function(row, value, step)
+    that returns the time.time() the step took effect (e.g. when a task actually started),
+    or None to use the time it returned. journal (a journal.Journal) records every step run, and
+    the steps it already holds are not run again.
+    """
+
+    def __init__(self, protocol, rows, handlers, journal=None):
+        self.protocol = protocol
+        self.rows = {row["position"]: row for row in rows}
+        self.handlers = handlers
+        self.journal = journal
+        self.queue = []  # heap of (due time, position, step)
+        self.log = [] if journal is None else list(journal.entries)  # one dict per step run
+
+    def schedule(self, due, position, step):
+        heapq.heappush(self.queue, (due, position, step))
+
+    def run(self):
+        """Run every step of every participant, returning the log of when each one ran"""
+        start = time.time()
+        last_steps = {entry["position"]: entry for entry in self.log}
+        for position in self.rows:
+            last = last_steps.get(position)
+            if last is None:
+                self.schedule(start + self.protocol[0][2], position, 0)
+            elif last["step"] + 1 < len(self.protocol):
+                # Keep the participant's own timing from the journaled step
+                step = last["step"] + 1
+                self.schedule(last["done"] + self.protocol[step][2], position, step)
+
+        while self.queue:
+            due, position, step = heapq.heappop(self.queue)
+            kind, value, _ = self.protocol[step]
+
+            wait = due - time.time()
+            if wait > 0:
+                print(f"\nNext step due in {datetime.timedelta(seconds=round(wait))}")
+                time.sleep(wait)
+
+            print(
+                f"\nParticipant {position+1}: step {step+1}/{len(self.protocol)} {kind} {value or ''}"
+            )
+            ran_at = time.time()
+            try:
+                done_at = self.handlers[kind](self.rows[position], value, step)
+            except Exception as e:
+                print(f"Error running {kind} for participant {position+1}: {e}")
+                done_at = None
+            if done_at is None:
+                done_at = time.time()
+
+            entry = {
+                "position": position,
+                "step": step,
+                "kind": kind,
+                "value": value,
+                "due": due,
+                "ran": ran_at,
+                "late": max(0.0, ran_at - due),
+                "done": done_at,
+            }
+            self.log.append(entry)
+            if self.journal is not None:
+                self.journal.append(entry)
+
+            # The next step is timed from when this one actually took effect
+            if step + 1 < len(self.protocol):
+                self.schedule(done_at + self.protocol[step + 1][2], position, step + 1)
+
+        if self.log:
+            worst = max(entry["late"] for entry in self.log)
+            print(f"\nProtocol finished, latest step ran {worst:.1f} s after it was due")
+        return self.log
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""
+shared session settings for The Islands
+
+holds the site address, reads the PHPSESSID from the session_cookie file and
+starts a logged-in Chrome for the scripts that need one. The address can be
+pointed elsewhere (e.g. at mock_server.py) with the ISLANDS_BASE_URL variable.
+Chrome loads pages eagerly and doesn't download images or fonts, which the
+scripts never look at (see ISLANDS_BLOCK)
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+import os
+import sys
+
+from tracing import span
+
+################################################################################################################
+## CONSTANTS
+################################################################################################################
+
+# Where The Islands is served, e.g. ISLANDS_BASE_URL=http://127.0.0.1:8000 for the mock server
+BASE_URL = os.environ.get("ISLANDS_BASE_URL", "https://islands.smp.uq.edu.au").rstrip("/")
+LOGIN_URL = f"{BASE_URL}/login.php"
+INDEX_URL = f"{BASE_URL}/index.php"
+
+SESSION_COOKIE_FILE = "session_cookie"
+
+# URL patterns of the resources Chrome can skip, blocked through the DevTools protocol
+BLOCKABLE_RESOURCES = {
+    "images": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.svg*", "*.webp*", "*.ico*"],
+    "fonts": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "css": ["*.css*"],
+}
+
+# Which of them to block, e.g. ISLANDS_BLOCK=images,fonts,css, or ISLANDS_BLOCK=none for everything
+# Stylesheets are only blocked when asked, as element visibility (and so Selenium's .text) can depend on them
+BLOCK = os.environ.get("ISLANDS_BLOCK", "images,fonts")
+
+# "eager" returns from driver.get() once the DOM is ready instead of after every image has loaded
+PAGE_LOAD_STRATEGY = os.environ.get("ISLANDS_PAGE_LOAD", "eager")
+
+# ISLANDS_CAPTURE=1 records Chrome's network events, so API replies can be read off them (see capture.py)
+CAPTURE = os.environ.get("ISLANDS_CAPTURE", "").lower() not in ("", "0", "no", "false")
+
+################################################################################################################
+## HELPERS
+################################################################################################################
+
+
+def read_session_id(path=SESSION_COOKIE_FILE):
+    """Read the PHPSESSID from the session_cookie file, exiting if it is missing or empty"""
+    try:
+        with open(path, "r") as cookie_file:
+            session_id = cookie_file.read().strip()
+            print(f"Read session ID from file: {session_id}")
+    except FileNotFoundError:
+        print(
+            "Error: session_cookie file not found. Please create this file with your session ID."
+        )
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error reading session_cookie file: {e}")
+        sys.exit(1)
+
+    # Check if session ID is empty
+    if not session_id:
+        print(
+            "Error: session_cookie file is empty. Please add your session ID to this file."
+        )
+        sys.exit(1)
+
+    return session_id
+
+
+def make_chrome_options():
+    """The Chrome flags every script runs with"""
+    chrome_options = Options()
+    chrome_options.add_experimental_option("detach", True)
+    chrome_options.add_argument("--start-maximized")  # Still useful for viewport size
+    chrome_options.add_argument("--headless=new")  # This runs Chrome in background
+    chrome_options.add_argument("--disable-gpu")  # Recommended for headless
+    chrome_options.add_argument("--window-size=1920,1080")  # Set viewport explicitly
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.page_load_strategy = PAGE_LOAD_STRATEGY
+    if CAPTURE:
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return chrome_options
+
+
+def blocked_url_patterns(block=BLOCK):
+    """URL patterns for a comma separated list of BLOCKABLE_RESOURCES kinds"""
+    patterns = []
+    for kind in block.split(","):
+        kind = kind.strip().lower()
+        if kind in ("", "none"):
+            continue
+        if kind not in BLOCKABLE_RESOURCES:
+            print(f"Warning: can't block unknown resource kind {kind}")
+            continue
+        patterns += BLOCKABLE_RESOURCES[kind]
+    return patterns
+
+
+def block_resources(driver, block=BLOCK):
+    """Stop Chrome downloading the resources in block, for every page it loads from now on"""
+    patterns = blocked_url_patterns(block)
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        print(f"Could not block {block}, loading everything: {e}")
+
+
+def login(driver, session_id):
+    """Set the PHPSESSID cookie on a fresh driver and land on index.php, exiting if the session is invalid"""
+    # Navigate to the login page
+    driver.get(LOGIN_URL)
+    driver.implicitly_wait(1)
+
+    # Replace any existing PHPSESSID with the one from file (for the host login.php is on)
+    driver.delete_cookie("PHPSESSID")
+    driver.add_cookie({"name": "PHPSESSID", "value": session_id, "path": "/"})
+
+    # Refresh the page to apply the cookie
+    driver.get(INDEX_URL)
+    driver.implicitly_wait(3)
+
+    # Check if login was successful
+    if "login.php" in driver.current_url:
+        print("Login failed - still on login page. Check if your session ID is valid.")
+        driver.quit()
+        sys.exit(1)
+    else:
+        print("Successfully logged in!")
+
+
+def start_logged_in_driver(session_id=None):
+    """Start headless Chrome and log it in with the session cookie"""
+    if session_id is None:
+        session_id = read_session_id()
+    driver = webdriver.Chrome(options=make_chrome_options())
+    block_resources(driver)
+    with span("login"):
+        login(driver, session_id)
+    return driver
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+"""
+runs a whole study in one process
+
+the same stages as complete_study.sh used to run as separate scripts (cache, find
+participants, collect their info, then give tasks and collect results), but sharing
+one logged-in Chrome, so it is started and logged in only once. The tasks and result
+collections follow PROTOCOL per participant (see scheduler.py) instead of global sleeps.
+With --resume an interrupted study carries on from the stages' journals (see journal.py).
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+import pandas as pd
+import os
+import time
+import datetime
+import argparse
+
+from session import read_session_id, start_logged_in_driver
+from http_backend import HttpBackend
+from navigation import load_participant_rows
+from scheduler import ProtocolScheduler
+from journal import Journal
+from results_store import ResultsStore
+from cache_store import CACHE_FILE
+from cache import build_cache
+from find_participants import find_participants
+from collect_participant_info import collect_participant_info
+from collect_latest_result import (
+    collect_result,
+    collect_result_http,
+    print_round,
+)
+from do_task import assign_task, find_task
+
+parser = argparse.ArgumentParser(description="Run a whole study with one Chrome session")
+parser.add_argument("sample_size", nargs="?", type=int, default=100)
+parser.add_argument("minimum_age", nargs="?", type=int, default=18)
+parser.add_argument("maximum_age", nargs="?", type=int, default=75)
+parser.add_argument(
+    "--http",
+    action="store_true",
+    help="read the read-only pages over HTTP and only use Chrome where JavaScript is needed",
+)
+parser.add_argument(
+    "--with-info",
+    action="store_true",
+    help="collect participant info during the consent visits instead of as a separate stage",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="Chrome sessions for collecting participant info (more than 1 starts extra browsers)",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="carry on an interrupted study from its journals instead of starting over",
+)
+
+################################################################################################################
+## PROTOCOL
+################################################################################################################
+
+# What happens to each participant once they are found: (step, task, seconds after their previous step)
+# Every participant gets the same delays, timed from when their own task actually started
+PROTOCOL = [
+    ("task", "ruler", 0),
+    ("collect", None, 60),
+    ("task", "cannabis", 0),
+    ("task", "ruler", 2700),  # 45 minutes after the cannabis
+    ("collect", None, 60),
+    ("task", "ruler", 6000),
+    ("collect", None, 60),
+]
+
+################################################################################################################
+## STAGES
+################################################################################################################
+
+
+def run_protocol(driver, use_http=False, resume=False):
+    """Give every participant the PROTOCOL tasks and collect their results on their own timing
+
+    each collect step is its own round in the results store, every task started is recorded
+    there too, and the time of every step goes to protocol_log.csv. Steps are journaled, so
+    resume picks up every participant where they were.
+    """
+    journal = Journal("protocol", resume)
+    rounds_journal = Journal("protocol_rounds", resume)
+    if journal.finished:
+        journal.close()
+        rounds_journal.close()
+        return journal.entries
+
+    rows = load_participant_rows("participant_ids.csv")
+    wait = WebDriverWait(driver, 10)
+
+    # Resolve the task names up front so a typo fails before anyone is visited
+    tasks = {value: find_task(value) for kind, value, _ in PROTOCOL if kind == "task"}
+
+    backend = None
+    if use_http:
+        backend = HttpBackend(read_session_id())
+        backend.login()
+
+    store = ResultsStore()
+    store.add_participants(rows)
+
+    # Collect step -> results round, numbered on from the rounds already in the store
+    if rounds_journal.entries:
+        first_round = rounds_journal.entries[0]["first_round"]
+    else:
+        first_round = store.next_round()
+        rounds_journal.append({"first_round": first_round})
+    collect_steps = [step for step, (kind, _, _) in enumerate(PROTOCOL) if kind == "collect"]
+    rounds = {step: first_round + number for number, step in enumerate(collect_steps)}
+
+    def give_task(row, query, step):
+        category, selected_task, task_code = tasks[query]
+        started_at = assign_task(driver, wait, row, selected_task, task_code)
+        if started_at is not None:
+            store.record_task_run(row, task_code, started_at)
+        return started_at
+
+    def collect(row, value, step):
+        try:
+            if backend is not None:
+                name, result = collect_result_http(backend, row)
+            else:
+                name, result = collect_result(driver, wait, row)
+        except Exception as e:
+            print(f"Error collecting result for participant {row['position']+1}: {e}")
+            name, result = "NA", 0
+        print(
+            f"Collected latest result for participant {row['position']+1}: {name}, result {result}"
+        )
+
+        store.record_result(row, rounds[step], name, result)
+        if len(store.round_results(rounds[step])) == len(rows):
+            print_round(store, rounds[step])
+        return None
+
+    scheduler = ProtocolScheduler(
+        PROTOCOL, rows, {"task": give_task, "collect": collect}, journal=journal
+    )
+    log = scheduler.run()
+
+    if backend is not None:
+        backend.close()
+    store.close()
+
+    data = pd.DataFrame(log)
+    for column in ("due", "ran", "done"):
+        data[column] = pd.to_datetime(data[column], unit="s")
+    data.to_csv("protocol_log.csv")
+    print("Step times saved to protocol_log.csv")
+
+    rounds_journal.finish()
+    journal.finish()
+    return log
+
+
+################################################################################################################
+## RUN
+################################################################################################################
+
+
+def run_study(args):
+    session_id = read_session_id()
+    driver = start_logged_in_driver(session_id)
+
+    try:
+        if args.resume and os.path.exists(CACHE_FILE):
+            print("Resuming with the existing cache")
+        else:
+            print("Caching The Islands...")
+            driver = build_cache(use_http=args.http, driver=driver)
+            print("Caching completed")
+
+        print("Finding paricipants...")
+        people_sampled, driver = find_participants(
+            args.sample_size,
+            args.minimum_age,
+            args.maximum_age,
+            use_http=args.http,
+            with_info=args.with_info,
+            resume=args.resume,
+            driver=driver,
+        )
+        print(f"{people_sampled} participants found")
+
+        if not args.with_info:
+            print("Getting participants info...")
+            collect_participant_info(
+                use_http=args.http,
+                workers=args.workers,
+                resume=args.resume,
+                driver=driver,
+            )
+            print("Participant info collected")
+
+        print("Running the protocol for every participant...")
+        run_protocol(driver, use_http=args.http, resume=args.resume)
+        print("Protocol completed")
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    start_time = time.time()
+    run_study(args)
+    end_time = time.time()
+
+    execution_time = end_time - start_time
+    print("All stages executed successfully")
+    print("Study runtime: " + str(datetime.timedelta(seconds=execution_time)))
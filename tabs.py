@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+"""
+several participants at once in the tabs of one Chrome
+
+a job is a generator that drives the current tab and yields whenever it has
+clicked something and is waiting on the server. TabScheduler keeps up to `tabs`
+jobs open, one per window handle, and goes round them: while one tab waits for
+its consent or task reply, the next participant is being opened in another.
+run_steps() runs a single job to the end in the current tab instead.
+
+a job that fails is reported and its tab reused, or dropped if the tab itself was
+closed. If Chrome is gone altogether run() raises, so the caller can restart it
+and run the jobs that never finished.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from selenium.common.exceptions import NoSuchWindowException, WebDriverException
+
+from tracing import span
+
+################################################################################################################
+## SCHEDULER
+################################################################################################################
+
+
+def run_steps(steps):
+    """Run a job straight through in the current tab, returning its value"""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+class TabScheduler:
+    """Runs jobs round-robin in up to `tabs` tabs of one driver
+
+    the window the driver is on becomes the first tab, the others are opened as needed and
+    reused for the next job; they are closed again when run() returns
+    """
+
+    def __init__(self, driver, tabs):
+        self.driver = driver
+        self.tabs = max(1, tabs)
+        self.home = driver.current_window_handle
+        self.handles = [self.home]
+
+    def free_handle(self, busy):
+        """A tab no job is using, opening a new one if they are all busy"""
+        for handle in self.handles:
+            if handle not in busy:
+                return handle
+        self.driver.switch_to.new_window("tab")
+        handle = self.driver.current_window_handle
+        self.handles.append(handle)
+        return handle
+
+    def step(self, handle, steps):
+        """Switch to a job's tab and run it up to its next wait"""
+        with span("tab step"):
+            self.driver.switch_to.window(handle)
+            next(steps)
+
+    def run(self, jobs, done):
+        """Run every (key, job) of jobs, calling done(key, value) as each one finishes
+
+        a job that raises is reported with done(key, None). If the driver itself stopped
+        responding, the WebDriverException is raised instead and the jobs still open are not reported
+        """
+        jobs = iter(jobs)
+        active = {}  # window handle -> (key, job)
+
+        try:
+            while True:
+                # Fill the free tabs with the next jobs
+                while len(active) < self.tabs:
+                    try:
+                        key, steps = next(jobs)
+                    except StopIteration:
+                        break
+                    active[self.free_handle(active)] = (key, steps)
+
+                if not active:
+                    break
+
+                # One step of every open job, in the order they were opened
+                for handle, (key, steps) in list(active.items()):
+                    try:
+                        self.step(handle, steps)
+                    except StopIteration as stop:
+                        del active[handle]
+                        done(key, stop.value)
+                    except Exception as e:
+                        print(f"Error in tab for {key}: {e}")
+                        del active[handle]
+                        self.recover(handle)
+                        done(key, None)
+        finally:
+            try:
+                self.close()
+            except WebDriverException as e:
+                # Chrome is gone, leave the error that stopped the run to the caller
+                print(f"Could not close the tabs: {e}")
+
+    def recover(self, handle):
+        """Check the driver outlived a job's error, dropping the job's tab if it was closed
+
+        raises WebDriverException if the driver doesn't answer or has no window left
+        """
+        alive = self.driver.window_handles
+        if handle in alive:
+            return
+        print("Tab was closed, opening another for the next participant")
+        self.handles.remove(handle)
+        if handle == self.home:
+            others = [other for other in self.handles if other in alive]
+            if others:
+                self.home = others[0]
+            elif alive:
+                self.home = alive[0]
+                self.handles.insert(0, self.home)
+            else:
+                raise NoSuchWindowException("every tab was closed")
+
+    def close(self):
+        """Close every tab but the first and switch back to it"""
+        for handle in self.handles:
+            if handle != self.home and handle in self.driver.window_handles:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+        self.handles = [self.home]
+        self.driver.switch_to.window(self.home)
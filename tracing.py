@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+timing spans around the hot steps
+
+wrap a step in `with span("city click"):` and, when the ISLANDS_TRACE variable
+names a file, every span is recorded and written there at exit as Chrome
+trace-event JSON (open it in Perfetto or chrome://tracing), followed by a
+latency summary per step. Without ISLANDS_TRACE a span costs one attribute check.
+
+    ISLANDS_TRACE=trace.json python3 do_task.py ruler
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+import numpy as np
+
+from contextlib import contextmanager
+import threading
+import atexit
+import json
+import time
+import os
+
+################################################################################################################
+## TRACER
+################################################################################################################
+
+
+class Tracer:
+    """Collects finished spans as (name, start, duration, thread, args)"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pid = os.getpid()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def record(self, name, start, duration, args):
+        with self.lock:
+            self.spans.append((name, start, duration, threading.get_ident(), args))
+
+    def trace_events(self):
+        """The spans as Chrome trace "complete" events, in microseconds"""
+        return [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": round(start * 1e6),
+                "dur": round(duration * 1e6),
+                "pid": self.pid,
+                "tid": thread,
+                "args": args,
+            }
+            for name, start, duration, thread, args in self.spans
+        ]
+
+    def export(self, path=None):
+        path = path or self.path
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": self.trace_events()}, trace_file)
+        print(f"Trace of {len(self.spans)} spans saved to {path}")
+
+    def summary(self):
+        """Count, total and percentiles of every span name, slowest total first"""
+        durations = {}
+        for name, _, duration, _, _ in self.spans:
+            durations.setdefault(name, []).append(duration)
+
+        rows = []
+        for name, values in durations.items():
+            values = np.array(values)
+            rows.append(
+                (
+                    name,
+                    len(values),
+                    values.sum(),
+                    np.percentile(values, 50),
+                    np.percentile(values, 95),
+                    values.max(),
+                )
+            )
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+    def print_summary(self):
+        print(f"\n{'step':24}{'count':>7}{'total s':>10}{'p50 s':>9}{'p95 s':>9}{'max s':>9}")
+        for name, count, total, p50, p95, longest in self.summary():
+            print(f"{name:24}{count:7d}{total:10.2f}{p50:9.3f}{p95:9.3f}{longest:9.3f}")
+
+    def finish(self):
+        """Write the trace and the summary, from the process that started tracing only"""
+        if self.enabled and self.spans and os.getpid() == self.pid:
+            self.export()
+            self.print_summary()
+
+
+TRACER = Tracer(os.environ.get("ISLANDS_TRACE") or None)
+atexit.register(TRACER.finish)
+
+
+@contextmanager
+def span(name, **args):
+    """Time the enclosed block as one step of the trace"""
+    if not TRACER.enabled:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        TRACER.record(name, start, time.time() - start, args)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+"""
+named readiness conditions for every page
+
+the stages used to sleep a second or two after each click, tab switch, chat and
+page load, however quickly the page was actually ready. wait_for() polls a named
+condition instead and returns the moment it holds. Every wait is timed as a
+"wait <name>" span, so with ISLANDS_TRACE set the summary shows how long each
+kind of page really takes (see tracing.py). A wait that times out prints a
+warning and returns None, the way the old sleeps carried on regardless.
+
+consent and task starts don't poll at all: watch_task() clicks and then waits
+inside the page on a MutationObserver, which answers the moment the detail box,
+the progress canvas or a new task result row shows up. start_watch() and
+finish_watch() split that click from the wait, for do_task.py's --tabs mode.
+"""
+
+################################################################################################################
+## IMPORTS
+################################################################################################################
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from tracing import span
+
+################################################################################################################
+## CONSTANTS
+################################################################################################################
+
+TIMEOUT = 10  # seconds before a wait gives up
+POLL = 0.1  # seconds between checks
+
+# What each page shows once it is usable, as CSS selectors
+PAGES = {
+    "index": 'a[href^="village"] div[class^="town town"], a[href^="village"] div[class^="towndot towndot"]',
+    "village": ".house",
+    "house": 'a[href^="islander.php"]',
+    "islander": "#t1tab",
+}
+
+# The elements matching a selector once the DOM has been parsed, or none before
+ELEMENTS_SCRIPT = r"""
+if (document.readyState === 'loading') { return []; }
+return Array.prototype.slice.call(document.querySelectorAll(arguments[0]));
+"""
+
+# What each islander tab shows once it is the one on display: the stats rows, the consent link or
+# task menu, and the chat box (the elements the stages read or click there)
+TABS = {
+    1: "tr",
+    2: "#obtain, #task_menu",
+    3: "#chatbox",
+}
+
+# Whether any element matching arguments[0] is displayed
+VISIBLE_SCRIPT = r"""
+return Array.prototype.some.call(document.querySelectorAll(arguments[0]), function (el) {
+    return el.getClientRects().length > 0 && window.getComputedStyle(el).visibility !== 'hidden';
+});
+"""
+
+COUNT_SCRIPT = "return document.querySelectorAll(arguments[0]).length;"
+
+# watchTask(target, timeout, done) clicks target (an element or a CSS selector) and calls done with
+# what the Tasks tab did: a new task result row, or the detail box / progress canvas showing a task
+# running. It returns false, without calling done, if there is nothing to click
+WATCHER = r"""
+function watchTask(target, timeout, done) {
+    function text(el) {
+        if (!el || !el.getClientRects().length || window.getComputedStyle(el).visibility === 'hidden') {
+            return '';
+        }
+        return el.innerText.replace(/\s+/g, ' ').trim();
+    }
+    function detail() { return text(document.getElementById('detail')); }
+    function running() {
+        var box = document.getElementById('detailbox');
+        return (!!box && box.style.display === 'block') || !!document.getElementById('progress');
+    }
+    var seen = new Set(document.querySelectorAll('.taskresulttask'));
+    var wasRunning = running(), detailBefore = detail();
+    function outcome() {
+        var rows = document.querySelectorAll('.taskresulttask');
+        for (var i = 0; i < rows.length; i++) {
+            if (!seen.has(rows[i])) { return {event: 'result', text: text(rows[i]), detail: detail()}; }
+        }
+        if (running() && (!wasRunning || detail() !== detailBefore)) {
+            return {event: 'running', text: '', detail: detail()};
+        }
+        return null;
+    }
+    var element = typeof target === 'string' ? document.querySelector(target) : target;
+    if (!element) { return false; }
+    var finished = false, timer = null;
+    var observer = new MutationObserver(check);
+    function finish(result) {
+        if (finished) { return; }
+        finished = true;
+        observer.disconnect();
+        clearTimeout(timer);
+        done(result);
+    }
+    function check() {
+        var result = outcome();
+        if (result) { finish(result); }
+    }
+    observer.observe(document.body, {
+        childList: true, subtree: true, characterData: true, attributes: true, attributeFilter: ['style']
+    });
+    timer = setTimeout(function () { finish({event: 'timeout', text: '', detail: detail()}); }, timeout * 1000);
+    element.click();
+    check();
+    return true;
+}
+"""
+
+MISSING = "{event: 'missing', text: '', detail: ''}"
+
+# Click and wait in one call
+WATCH_TASK_SCRIPT = (
+    WATCHER
+    + """
+var done = arguments[arguments.length - 1];
+if (!watchTask(arguments[0], arguments[1], done)) { done(%s); }
+"""
+    % MISSING
+)
+
+# Click and leave the outcome on the page for FINISH_WATCH_SCRIPT, so other tabs can be served meanwhile
+START_WATCH_SCRIPT = (
+    WATCHER
+    + """
+window.islandsOutcome = null;
+window.islandsWaiting = [];
+return watchTask(arguments[0], arguments[1], function (result) {
+    window.islandsOutcome = result;
+    window.islandsWaiting.forEach(function (done) { done(result); });
+});
+"""
+)
+
+FINISH_WATCH_SCRIPT = """
+var done = arguments[arguments.length - 1];
+if (window.islandsOutcome) { done(window.islandsOutcome); } else { window.islandsWaiting.push(done); }
+"""
+
+################################################################################################################
+## CONDITIONS
+################################################################################################################
+
+
+def elements_present(selector):
+    """Condition giving the elements matching selector once there are any"""
+
+    def condition(driver):
+        return driver.execute_script(ELEMENTS_SCRIPT, selector) or False
+
+    return condition
+
+
+def tab_shown(tab):
+    """Condition holding once what tab number `tab` shows (see TABS) is displayed"""
+
+    def condition(driver):
+        return driver.execute_script(VISIBLE_SCRIPT, TABS[tab])
+
+    return condition
+
+
+def rows_added(selector, before):
+    """Condition giving the new number of selector rows once there are more than before"""
+
+    def condition(driver):
+        count = driver.execute_script(COUNT_SCRIPT, selector)
+        return count if count > before else False
+
+    return condition
+
+
+################################################################################################################
+## WAITS
+################################################################################################################
+
+
+def wait_for(driver, name, condition, timeout=TIMEOUT):
+    """Poll condition until it holds, returning its value, or None after a warning on timeout"""
+    with span(f"wait {name}"):
+        try:
+            return WebDriverWait(driver, timeout, poll_frequency=POLL).until(condition)
+        except TimeoutException:
+            print(f"Timed out after {timeout}s waiting for {name}")
+        except WebDriverException as e:
+            print(f"Error waiting for {name}: {e}")
+    return None
+
+
+def page_ready(driver, page, timeout=TIMEOUT):
+    """Wait for index, village, house or islander to be usable, returning its key elements"""
+    return wait_for(driver, page, elements_present(PAGES[page]), timeout)
+
+
+def tab_ready(driver, tab, timeout=TIMEOUT):
+    """Wait for a tab switch (1 stats, 2 tasks, 3 chat) to have swapped the content in"""
+    return wait_for(driver, "tab", tab_shown(tab), timeout)
+
+
+def count_rows(driver, selector):
+    return driver.execute_script(COUNT_SCRIPT, selector)
+
+
+def chat_reply_ready(driver, before, timeout=TIMEOUT):
+    """Wait for a chat reply to be added after `before` of them"""
+    return wait_for(driver, "chat reply", rows_added(".chatbot", before), timeout)
+
+
+################################################################################################################
+## WATCHERS
+################################################################################################################
+
+
+def watch_task(driver, target, name="task start", timeout=TIMEOUT):
+    """Click target and wait in the page for the Tasks tab to react, in one round trip
+
+    target is an element or a CSS selector. Returns {"event", "text", "detail"}: event is
+    "result" with text the new task result row, "running" once the detail box or progress
+    canvas appears, "missing" if there was nothing to click, or "timeout"
+    """
+    with span(f"wait {name}"):
+        try:
+            # The page gives up at timeout, Selenium only needs to outlast it
+            driver.set_script_timeout(timeout + 5)
+            return driver.execute_async_script(WATCH_TASK_SCRIPT, target, timeout)
+        except WebDriverException as e:
+            print(f"Error waiting for {name}: {e}")
+    return {"event": "timeout", "text": "", "detail": ""}
+
+
+def start_watch(driver, target, timeout=TIMEOUT):
+    """watch_task's click without the wait, returning False if there was nothing to click
+
+    the outcome stays on the page until finish_watch collects it, so the driver is free to work
+    in other tabs meanwhile
+    """
+    return driver.execute_script(START_WATCH_SCRIPT, target, timeout)
+
+
+def finish_watch(driver, name="task start", timeout=TIMEOUT):
+    """The outcome of the last start_watch in the current tab, waiting for it if it isn't in yet"""
+    with span(f"wait {name}"):
+        try:
+            driver.set_script_timeout(timeout + 5)
+            return driver.execute_async_script(FINISH_WATCH_SCRIPT)
+        except WebDriverException as e:
+            print(f"Error waiting for {name}: {e}")
+    return {"event": "timeout", "text": "", "detail": ""}